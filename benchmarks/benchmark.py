@@ -0,0 +1,501 @@
+"""
+Benchmarks of the actions, run on CPU only.
+
+    python -m benchmarks.benchmark --output results.json
+    python -m benchmarks.benchmark --baseline results.json
+
+Each benchmark returns {name: (value, unit, higher_is_better)}.
+With a baseline, the results worse than the baseline by more than
+the tolerance are flagged as regressions.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import platform
+import importlib.util
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+import click
+
+os.environ["CUDA_VISIBLE_DEVICES"] = ""
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+ACTIONS = [
+    "train",
+    "generate",
+    "evaluate",
+    "convert",
+]
+WORKING_AREA = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run_cli(output_area: str, *arguments) -> float:
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "run.py", "--output_area", output_area, *arguments],
+        cwd=WORKING_AREA,
+        check=True,
+        capture_output=True,
+    )
+    return time.perf_counter() - start
+
+
+def benchmark_cli_startup(repeats: int = 5, **_) -> dict:
+    """
+    Time from the start of the process until the model command
+    of the action is reached, with the config and options loaded.
+    TensorFlow is not imported.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as output_area:
+        for action in ACTIONS:
+            times = [
+                _run_cli(output_area, action, "test", "--help")
+                for _ in range(repeats)
+            ]
+            results[f"cli_startup_{action}"] = (
+                statistics.median(times),
+                "s",
+                False,
+            )
+    return results
+
+
+def benchmark_cold_start(repeats: int = 3, **_) -> dict:
+    """
+    Duration of a whole run of the action in a new process, on a single
+    file of two samples, so that it is made of the startup: the imports
+    of TensorFlow and of the action, the config, the dataset and model
+    creation and the first traced graphs. The data and the weights used
+    by the actions are prepared beforehand, untimed.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+
+        def output_area():
+            return tempfile.mkdtemp(dir=directory)
+
+        data_dir = output_area()
+        data_options = [
+            "--tfrecord_training_files",
+            data_dir,
+            "--tfrecord_validation_files",
+            data_dir,
+        ]
+        generate_options = [
+            "test",
+            "--generator_training_files_no",
+            "1",
+            "--generator_training_samples_no_per_file",
+            "2",
+        ]
+        _run_cli(output_area(), "generate", *data_options, *generate_options)
+        weights_area = output_area()
+        _run_cli(
+            weights_area,
+            "train",
+            *data_options,
+            "--model_checkpoint",
+            "True",
+            "--model_checkpoint_save_best_only",
+            "False",
+            "test",
+        )
+        weights = os.path.join(weights_area, "model_with_weights.tf")
+        arguments = {
+            "train": lambda: ["train", *data_options, "test"],
+            "generate": lambda: [
+                "generate",
+                "--tfrecord_training_files",
+                output_area(),
+                *generate_options,
+            ],
+            "evaluate": lambda: [
+                "evaluate",
+                "--tfrecord_test_files",
+                data_dir,
+                "--model_path",
+                weights,
+                "test",
+            ],
+            "convert": lambda: [
+                "convert",
+                "--converter_model_path",
+                weights,
+                "test",
+            ],
+        }
+        for action in ACTIONS:
+            if action == "convert" and not importlib.util.find_spec("tf2onnx"):
+                click.echo("--> tf2onnx not installed, convert skipped.")
+                continue
+            times = [
+                _run_cli(output_area(), *arguments[action]())
+                for _ in range(repeats)
+            ]
+            results[f"cold_start_{action}"] = (
+                statistics.median(times),
+                "s",
+                False,
+            )
+    return results
+
+
+def configure():
+    """
+    The config is configured once per process, so its output area
+    must outlive the temporary directories of the benchmarks.
+    The metrics log is disabled, not to be timed with the benchmarks.
+    """
+    from core.config import Config
+
+    config = Config()
+    if not config.configured:
+        output_area = tempfile.mkdtemp(prefix="benchmark_")
+        atexit.register(shutil.rmtree, output_area, ignore_errors=True)
+        config.configure(
+            verbosity="WARNING",
+            output_area=output_area,
+            action="generate",
+            model_name="test",
+        )
+        config.metrics_log = False
+    return config
+
+
+def generate_dataset(config, directory: str, files_no: int, samples_no: int):
+    from core.dataset import generate_tfrecord_datagenerator
+    from models.test.dataset import generate_tfrecord_encoder
+
+    config.tfrecord_training_files = directory
+    generate_tfrecord_datagenerator(
+        generate_tfrecord_encoder(files_no=files_no, samples_no=samples_no),
+        "training",
+    )()
+
+
+def directory_size(directory: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(directory, file_name))
+        for file_name in os.listdir(directory)
+    )
+
+
+def benchmark_tfrecord_write(files_no: int, samples_no: int, **_) -> dict:
+    """
+    TensorFlow is imported and a first file written before the timing,
+    so that only the steady writing is measured.
+    """
+    import tensorflow  # noqa: F401
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = configure()
+        warm_up_dir = os.path.join(directory, "warm_up")
+        data_dir = os.path.join(directory, "data")
+        os.makedirs(warm_up_dir)
+        os.makedirs(data_dir)
+        generate_dataset(config, warm_up_dir, 1, samples_no)
+        start = time.perf_counter()
+        generate_dataset(config, data_dir, files_no, samples_no)
+        duration = time.perf_counter() - start
+        size = directory_size(data_dir)
+    return {
+        "tfrecord_write_throughput": (size / duration / 1e6, "MB/s", True),
+        "tfrecord_write_files_per_second": (
+            files_no / duration,
+            "files/s",
+            True,
+        ),
+    }
+
+
+def benchmark_tfrecord_read(files_no: int, samples_no: int, **_) -> dict:
+    from core.dataset import generate_tfrecord_dataloader
+    from models.test.dataset import generate_tfrecord_decoder
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = configure()
+        data_dir = os.path.join(directory, "data")
+        os.makedirs(data_dir)
+        generate_dataset(config, data_dir, files_no, samples_no)
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )()
+        start = time.perf_counter()
+        records_no = sum(1 for _ in dataset)
+        duration = time.perf_counter() - start
+    return {
+        "tfrecord_read_decode_throughput": (
+            records_no / duration,
+            "records/s",
+            True,
+        ),
+    }
+
+
+def benchmark_npy_read(files_no: int, samples_no: int, **_) -> dict:
+    """
+    Reads the same records as the TFRecord benchmark,
+    converted to memory mapped npy shards.
+    """
+    from core.dataset import generate_npy_converter, generate_npy_dataloader
+    from models.test.dataset import generate_tfrecord_decoder
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = configure()
+        data_dir = os.path.join(directory, "data")
+        npy_dir = os.path.join(directory, "npy")
+        os.makedirs(data_dir)
+        os.makedirs(npy_dir)
+        generate_dataset(config, data_dir, files_no, samples_no)
+        config.npy_training_files = npy_dir
+        start = time.perf_counter()
+        generate_npy_converter(generate_tfrecord_decoder(), "training")()
+        conversion_duration = time.perf_counter() - start
+        dataset = generate_npy_dataloader("training")()
+        start = time.perf_counter()
+        records_no = sum(1 for _ in dataset)
+        duration = time.perf_counter() - start
+    return {
+        "npy_conversion_files_per_second": (
+            files_no / conversion_duration,
+            "files/s",
+            True,
+        ),
+        "npy_read_throughput": (records_no / duration, "records/s", True),
+    }
+
+
+def benchmark_training(files_no: int, samples_no: int, **_) -> dict:
+    import tensorflow as tf
+    from core.train import train
+    from core.dataset import generate_tfrecord_dataloader
+    from models.test.dataset import generate_tfrecord_decoder
+    from models.test.model import generate_model
+    from models.test.loss import generate_loss
+
+    class StepCounter(tf.keras.callbacks.Callback):
+        """
+        Besides the whole training, times the steady state: the training
+        steps after the first one of each epoch, which includes the
+        tracing or the iterator creation, and without the validation.
+        """
+
+        def on_train_begin(self, logs=None):
+            self.steps = 0
+            self.steady_steps = 0
+            self.steady_duration = 0.0
+            self.start = time.perf_counter()
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.last_step_end = None
+
+        def on_train_batch_end(self, batch, logs=None):
+            self.steps += 1
+            now = time.perf_counter()
+            if self.last_step_end is not None:
+                self.steady_steps += 1
+                self.steady_duration += now - self.last_step_end
+            self.last_step_end = now
+
+        def on_train_end(self, logs=None):
+            self.duration = time.perf_counter() - self.start
+
+    with tempfile.TemporaryDirectory() as directory:
+        config = configure()
+        data_dir = os.path.join(directory, "data")
+        os.makedirs(data_dir)
+        generate_dataset(config, data_dir, files_no, samples_no)
+        config.set_action("train", ignore_already_set=True)
+        config.tfrecord_validation_files = data_dir
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )()
+        step_counter = StepCounter()
+        train(
+            generate_model,
+            generate_loss,
+            dataset,
+            dataset,
+            custom_callbacks=[step_counter],
+        )
+        config.set_action("generate", ignore_already_set=True)
+    return {
+        "training_steps_per_second": (
+            step_counter.steps / step_counter.duration,
+            "steps/s",
+            True,
+        ),
+        "training_steady_steps_per_second": (
+            step_counter.steady_steps / step_counter.steady_duration
+            if step_counter.steady_duration
+            else 0.0,
+            "steps/s",
+            True,
+        ),
+    }
+
+
+def benchmark_logging(records_no: int = 20000, **_) -> dict:
+    """
+    Time spent by the caller to emit DEBUG records,
+    with the synchronous and the asynchronous handlers.
+    """
+    import logging
+    from core.logger import generate_handlers
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory, open(
+        os.devnull, "w"
+    ) as devnull:
+        for asynchronous in [False, True]:
+            mode = "async" if asynchronous else "sync"
+            logger = logging.getLogger(f"benchmark_{mode}")
+            logger.propagate = False
+            logger.setLevel(logging.DEBUG)
+            handlers = generate_handlers(
+                directory=directory,
+                stdout=devnull,
+                asynchronous=asynchronous,
+            )
+            for handler in handlers:
+                logger.addHandler(handler)
+            start = time.perf_counter()
+            for record_no in range(records_no):
+                logger.debug(f"--> (DEFAULT) 'option_{record_no}': {mode}")
+            duration = time.perf_counter() - start
+            for handler in handlers:
+                if asynchronous:
+                    atexit.unregister(handler.listener.stop)
+                    handler.listener.stop()
+                logger.removeHandler(handler)
+                handler.close()
+            results[f"logging_{mode}_throughput"] = (
+                records_no / duration,
+                "records/s",
+                True,
+            )
+    return results
+
+
+BENCHMARKS = {
+    "cli_startup": benchmark_cli_startup,
+    "cold_start": benchmark_cold_start,
+    "tfrecord_write": benchmark_tfrecord_write,
+    "tfrecord_read": benchmark_tfrecord_read,
+    "npy_read": benchmark_npy_read,
+    "training": benchmark_training,
+    "logging": benchmark_logging,
+}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        value = result["value"]
+        base = baseline[name]["value"]
+        if result["higher_is_better"]:
+            regression = value < base * (1 - tolerance)
+        else:
+            regression = value > base * (1 + tolerance)
+        change = (value - base) / base if base else 0.0
+        click.echo(
+            f"{'REGRESSION' if regression else 'ok':>10}  {name:40s} "
+            f"{base:12.4f} -> {value:12.4f} {result['unit']:10s} "
+            f"({change:+.1%})"
+        )
+        if regression:
+            regressions.append(name)
+    return regressions
+
+
+@click.command()
+@click.option(
+    "--benchmark",
+    "benchmarks",
+    multiple=True,
+    type=click.Choice(list(BENCHMARKS)),
+    help="Benchmarks to run. All of them if not provided.",
+)
+@click.option(
+    "--output",
+    default=None,
+    type=click.Path(),
+    help="JSON file to write the results to.",
+)
+@click.option(
+    "--baseline",
+    default=None,
+    type=click.Path(exists=True),
+    help="JSON file with the results to compare with.",
+)
+@click.option(
+    "--tolerance",
+    default=0.2,
+    type=click.FloatRange(min=0),
+    help="Relative change with respect to the baseline "
+    "flagged as a regression.",
+)
+@click.option(
+    "--files_no",
+    default=20,
+    type=click.IntRange(min=1),
+    help="Number of TFRecord files in the datasets.",
+)
+@click.option(
+    "--samples_no",
+    default=100,
+    type=click.IntRange(min=1),
+    help="Number of samples per TFRecord file.",
+)
+def main(benchmarks, output, baseline, tolerance, **kwargs):
+    os.chdir(WORKING_AREA)
+    results = {}
+    for name in benchmarks or BENCHMARKS:
+        click.echo(f"-> Running the '{name}' benchmark.")
+        for result_name, (value, unit, higher_is_better) in BENCHMARKS[name](
+            **kwargs
+        ).items():
+            results[result_name] = {
+                "value": value,
+                "unit": unit,
+                "higher_is_better": higher_is_better,
+            }
+            click.echo(f"--> {result_name}: {value:.4f} {unit}")
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(
+                {
+                    "metadata": {
+                        "time": datetime.now().isoformat(),
+                        "python": platform.python_version(),
+                        "machine": platform.machine(),
+                        "cpu_count": os.cpu_count(),
+                        "parameters": kwargs,
+                    },
+                    "results": results,
+                },
+                output_file,
+                indent=2,
+            )
+        click.echo(f"-> Results written to '{output}'.")
+    if baseline:
+        with open(baseline) as baseline_file:
+            baseline_results = json.load(baseline_file)["results"]
+        click.echo(f"-> Comparing with '{baseline}'.")
+        regressions = compare(results, baseline_results, tolerance)
+        if regressions:
+            click.echo(f"-> {len(regressions)} regression(s) found.")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
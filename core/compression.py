@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import tempfile
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import click
+
+from core.config import Config
+from core.dataset import read_tfrecord_manifest, update_tfrecord_manifest
+from core.metrics import log_metrics, timed
+from core.utils import add_options, get_global_batch_size
+
+# (compression type, compression level)
+COMPRESSION_SETTINGS = [
+    ("", None),
+    ("ZLIB", 1),
+    ("ZLIB", 6),
+    ("ZLIB", 9),
+    ("GZIP", 1),
+    ("GZIP", 6),
+    ("GZIP", 9),
+]
+COMPRESSION_BENCHMARK_FILE = "compression_benchmark.json"
+
+
+def _read_records(file_path: str, compression_type: str) -> list:
+    import tensorflow as tf
+
+    return list(
+        tf.data.TFRecordDataset(
+            file_path, compression_type=compression_type
+        ).as_numpy_iterator()
+    )
+
+
+def _write_records(
+    file_path: str, records, compression_type: str, compression_level
+) -> int:
+    """
+    Writes any iterable of serialized records.
+    Returns the number of records.
+    """
+    import tensorflow as tf
+
+    options = tf.io.TFRecordOptions(
+        compression_type=compression_type,
+        compression_level=compression_level,
+    )
+    records_no = 0
+    with tf.io.TFRecordWriter(file_path, options=options) as writer:
+        for record in records:
+            writer.write(record)
+            records_no += 1
+    return records_no
+
+
+def transcode_tfrecord_file(
+    source: str,
+    destination: str,
+    source_compression_type: str,
+    compression_type: str,
+    compression_level,
+) -> int:
+    """
+    Rewrites the serialized records as they are, without decoding them.
+    They are streamed one by one, so that a file is never held in memory.
+    Returns the number of records.
+    """
+    import tensorflow as tf
+
+    return _write_records(
+        destination,
+        tf.data.TFRecordDataset(
+            source, compression_type=source_compression_type
+        ).as_numpy_iterator(),
+        compression_type,
+        compression_level,
+    )
+
+
+def benchmark_compression(decoder=None, config=None) -> dict:
+    """
+    Writes a sample of the training files with every compression setting,
+    then reads them back, decoded with the decoder if provided.
+    """
+    import tensorflow as tf
+
+    config = config or Config()
+    files_dir = config.tfrecord_training_files
+    if not files_dir or not os.path.isdir(files_dir):
+        msg = (
+            f"TFRecord directory '{files_dir}' for"
+            " the compression benchmark does not exist."
+        )
+        config.log.error(msg)
+        raise FileNotFoundError(msg)
+    files = [
+        os.path.join(files_dir, file_name)
+        for file_name in sorted(os.listdir(files_dir))
+        if file_name.endswith(".tf")
+    ][: config.compression_benchmark_files_no]
+    if not files:
+        msg = f"No TFRecord files found in '{files_dir}'."
+        config.log.error(msg)
+        raise FileNotFoundError(msg)
+    config.log.info(
+        f"-> Benchmarking the TFRecord compression on {len(files)} file(s)."
+    )
+    samples = [
+        _read_records(file, config.tfrecord_compression_type) for file in files
+    ]
+    records_no = sum(len(records) for records in samples)
+    raw_size = sum(len(record) for records in samples for record in records)
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for compression_type, compression_level in COMPRESSION_SETTINGS:
+            paths = [
+                os.path.join(directory, f"{index}.tf")
+                for index in range(len(files))
+            ]
+            start = time.perf_counter()
+            for path, records in zip(paths, samples):
+                _write_records(
+                    path, records, compression_type, compression_level
+                )
+            write_duration = time.perf_counter() - start
+            size = sum(os.path.getsize(path) for path in paths)
+            dataset = tf.data.TFRecordDataset(
+                paths, compression_type=compression_type
+            )
+            if decoder is not None:
+                if config.batched_decoding:
+                    dataset = dataset.batch(get_global_batch_size(config))
+                dataset = dataset.map(
+                    decoder, num_parallel_calls=tf.data.AUTOTUNE
+                )
+            start = time.perf_counter()
+            for _ in dataset:
+                pass
+            read_duration = time.perf_counter() - start
+            result = {
+                "compression_type": compression_type,
+                "compression_level": compression_level,
+                "write_megabytes_per_second": (
+                    raw_size / 1024**2 / write_duration
+                ),
+                "read_records_per_second": records_no / read_duration,
+                "size": size,
+                "compression_ratio": raw_size / size,
+            }
+            results.append(result)
+            log_metrics("compression_benchmark", config=config, **result)
+            for path in paths:
+                os.remove(path)
+    smallest = min(result["size"] for result in results)
+    recommended = max(
+        (
+            result
+            for result in results
+            if result["size"]
+            <= config.compression_benchmark_size_tolerance * smallest
+        ),
+        key=lambda result: result["read_records_per_second"],
+    )
+    config.log.info(
+        "--> Type | Level | Write MB/s | Read records/s | Size | Ratio"
+    )
+    for result in results:
+        config.log.info(
+            f"--> {result['compression_type'] or 'none'} | "
+            f"{result['compression_level'] or '-'} | "
+            f"{result['write_megabytes_per_second']:.2f} | "
+            f"{result['read_records_per_second']:.1f} | "
+            f"{result['size']} | "
+            f"{result['compression_ratio']:.2f}"
+        )
+    config.log.info(
+        "--> Recommended: "
+        f"--tfrecord_compression_type '{recommended['compression_type']}'"
+        + (
+            f" --tfrecord_compression_level "
+            f"{recommended['compression_level']}"
+            if recommended["compression_level"]
+            else ""
+        )
+        + "."
+    )
+    benchmark = {
+        "files": files,
+        "records": records_no,
+        "raw_size": raw_size,
+        "results": results,
+        "recommended": recommended,
+    }
+    with open(
+        os.path.join(config.output_area, COMPRESSION_BENCHMARK_FILE), "w"
+    ) as f:
+        json.dump(benchmark, f, indent=2)
+    return benchmark
+
+
+def transcode():
+    config = Config()
+    start_time = datetime.now()
+    config.log.info("-> Started transcoding the TFRecord files.")
+    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    source_dir = config.transcoder_source_files
+    destination_dir = config.transcoder_destination_files
+    for files_dir in [source_dir, destination_dir]:
+        if not files_dir or not os.path.isdir(files_dir):
+            msg = (
+                f"TFRecord directory '{files_dir}' does not exist. "
+                "Please create it manually."
+            )
+            config.log.error(msg)
+            raise FileNotFoundError(msg)
+    if os.path.samefile(source_dir, destination_dir):
+        msg = "The source and destination directories must be different."
+        config.log.error(msg)
+        raise ValueError(msg)
+    source_manifest = read_tfrecord_manifest(source_dir) or {}
+    source_compression_type = _source_compression_type(
+        config, source_dir, source_manifest
+    )
+    file_names = [
+        file_name
+        for file_name in sorted(os.listdir(source_dir))
+        if file_name.endswith(".tf")
+    ]
+    existing = [
+        file_name
+        for file_name in os.listdir(destination_dir)
+        if file_name.endswith(".tf") and file_name not in file_names
+    ]
+    config.log.debug(
+        f"--> {len(file_names)} file(s) from "
+        f"'{source_compression_type or 'none'}' to "
+        f"'{config.transcoder_compression_type or 'none'}' "
+        f"with {config.transcoder_workers} worker(s)."
+    )
+    with timed("transcode", files=len(file_names)) as metrics:
+        # the records are read and written by TensorFlow
+        # outside of the GIL, so threads are enough
+        with ThreadPoolExecutor(config.transcoder_workers) as executor:
+            records = list(
+                executor.map(
+                    lambda file_name: transcode_tfrecord_file(
+                        os.path.join(source_dir, file_name),
+                        os.path.join(destination_dir, file_name),
+                        source_compression_type,
+                        config.transcoder_compression_type,
+                        config.transcoder_compression_level,
+                    ),
+                    file_names,
+                )
+            )
+        metrics["records"] = sum(records)
+    update_tfrecord_manifest(
+        config,
+        destination_dir,
+        existing,
+        [
+            (
+                file_name,
+                records_no,
+                os.path.getsize(os.path.join(destination_dir, file_name)),
+            )
+            for file_name, records_no in zip(file_names, records)
+        ],
+        config.transcoder_compression_type,
+        config.transcoder_compression_level,
+        source_manifest.get("input_shape"),
+    )
+    config.log.info("-> Finished transcoding the TFRecord files.")
+    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    config.log.info(f"--> Took: {datetime.now() - start_time} h.")
+
+
+def _source_compression_type(config, source_dir: str, manifest: dict) -> str:
+    """
+    The compression type of the manifest of the source files, or of the
+    config if they have no manifest.
+    """
+    option = config.transcoder_source_compression_type
+    if manifest:
+        if option is not None and option != manifest["compression_type"]:
+            config.log.warning(
+                f"--> The files in '{source_dir}' are compressed with "
+                f"'{manifest['compression_type']}' according to their "
+                f"manifest, not with '{option}'. Using the manifest."
+            )
+        return manifest["compression_type"]
+    if option is None:
+        msg = (
+            f"No manifest in '{source_dir}'. The compression type of "
+            "the files to transcode must be given."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+    return option
+
+
+def transcoder_cli_generator():
+    @click.command(
+        name="transcode",
+        context_settings={"show_default": True},
+    )
+    @add_options(mode="transcoder")
+    def transcode_cli(*_, **kwargs):
+        """
+        Rewrite TFRecord files with another compression.
+        """
+        config = Config()
+        config.set_action("transcode")
+        config.log.debug(
+            "-> Updating the TRANSCODER configuration with CLI parameters."
+        )
+        for prop, value in kwargs.items():
+            default = getattr(config, prop)
+            if default != value:
+                setattr(config, prop, value)
+        config.log.debug("--> Done.")
+        transcode()
+
+    return transcode_cli
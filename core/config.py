@@ -1,8 +1,8 @@
-import git
-import yaml
 import os
 import copy
+import logging
 from datetime import datetime
+from functools import lru_cache
 from importlib import import_module
 
 
@@ -15,6 +15,8 @@ from options import (
     DATA_OPTIONS,
     CONVERTER_OPTIONS,
     EVALUATION_OPTIONS,
+    TRANSCODER_OPTIONS,
+    PREDICTION_OPTIONS,
 )
 from core.constants import (
     PROJECT_NAME,
@@ -23,6 +25,43 @@ from core.constants import (
 )
 
 
+class _VersionedDict(dict):
+    """
+    Dict counting its changes, e.g. to rebuild what depends on it
+    only when it changed.
+    """
+
+    version = 0
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key, default=None):
+        self.version += 1
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
 class Config:
     general_options = GENERAL_OPTIONS
 
@@ -42,9 +81,19 @@ class Config:
         **DATA_OPTIONS,
     }
 
-    converter_options = CONVERTER_OPTIONS
+    converter_options = {
+        **DATA_OPTIONS,
+        **CONVERTER_OPTIONS,
+    }
+
+    transcoder_options = TRANSCODER_OPTIONS
+
+    prediction_options = {
+        **DATA_OPTIONS,
+        **PREDICTION_OPTIONS,
+    }
 
-    model_options = {}
+    model_options = _VersionedDict()
 
     _model_name = ""
 
@@ -59,17 +108,51 @@ class Config:
             **Config.model_options,
             **Config.converter_options,
             **Config.evaluation_options,
+            **Config.transcoder_options,
+            **Config.prediction_options,
         }
 
+    # (model options, their version, merged options)
+    _options_cache = None
+
+    # set once the config is frozen
+    _snapshot = None
+
+    # members which are not options
+    _internal_members = frozenset(
+        [
+            "_frozen",
+            "_rigid",
+            "configured",
+            "_options_cache",
+            "_snapshot",
+        ]
+    )
+
+    # the values of these types are copied when set
+    _mutable_types = (list, dict, set, bytearray)
+
     def options(self):
-        return {
-            **self.general_options,
-            **self.training_options,
-            **self.data_generator_options,
-            **self.model_options,
-            **self.converter_options,
-            **self.evaluation_options,
-        }
+        # merged again only if the model options changed
+        if self._options_cache is None or self._options_cache[:2] != (
+            id(self.model_options),
+            self.model_options.version,
+        ):
+            self._options_cache = (
+                id(self.model_options),
+                self.model_options.version,
+                {
+                    **self.general_options,
+                    **self.training_options,
+                    **self.data_generator_options,
+                    **self.model_options,
+                    **self.converter_options,
+                    **self.evaluation_options,
+                    **self.transcoder_options,
+                    **self.prediction_options,
+                },
+            )
+        return self._options_cache[2]
 
     _options_with_dirs = [
         # "tfrecord_training_files",
@@ -124,6 +207,7 @@ class Config:
                 f"models.{model_name}.options"
             ).OPTIONS
             self.model_options.update(model_options)
+            self._options_cache = None
             if self.configured:
                 self._unrigidify()
                 for name, value in model_options.items():
@@ -181,6 +265,7 @@ class Config:
         self.log = activate_logger(
             directory=output_area,
             logger_level=verbosity,
+            asynchronous=kwargs.get("async_logging", False),
         )
         self.log.info("Initialized a new config.")
         self._set_working_area()
@@ -198,6 +283,8 @@ class Config:
         # update the options with the config file if provided
         config_file = kwargs.get("config_file") or self.config_file
         if config_file:
+            import yaml
+
             self.log.debug(f"-> Loading options from file: '{config_file}'.")
             with open(config_file) as yaml_dump_file:
                 data = yaml.load(yaml_dump_file, Loader=yaml.FullLoader)
@@ -224,12 +311,14 @@ class Config:
             self.set_action(action)
 
     def __setattr__(self, key, value, from_config_file=False):
-        if key in ["_frozen", "_rigid", "configured"]:
+        if key in self._internal_members:
             object.__setattr__(self, key, value)
             return
         if not self.configured:
             raise ValueError("Configuration not yet initialized!")
-        new_value = copy.copy(value)  # FIXME: needed? or too paranoid
+        new_value = value
+        if isinstance(value, self._mutable_types):
+            new_value = copy.copy(value)
         if self._frozen and key != "_frozen":
             msg = (
                 "Config became a frozen class. "
@@ -253,29 +342,21 @@ class Config:
                 new_value = "/".join([self.output_area, new_value])
             if key in self._options_with_dirs and new_value:
                 new_value = self.change_to_local_paths(key, value)
-            override_text = "DEFAULT"
-            if from_config_file:
-                override_text = "NEW VALUE FROM CONFIG FILE"
-            elif self._rigid:
-                override_text = "NEW VALUE FROM CLI"
-            self.log.debug(f"--> ({override_text}) '{key}': {new_value}")
+            if self.log.isEnabledFor(logging.DEBUG):
+                override_text = "DEFAULT"
+                if from_config_file:
+                    override_text = "NEW VALUE FROM CONFIG FILE"
+                elif self._rigid:
+                    override_text = "NEW VALUE FROM CLI"
+                self.log.debug(f"--> ({override_text}) '{key}': {new_value}")
         object.__setattr__(self, key, new_value)
         # if self._rigid:
         #     self._check_for_non_configurables(key=key)
 
     def _set_working_area(self):
-        self.working_area = None
-        repo = None
-        path = None
-        try:
-            repo = git.Repo(".", search_parent_directories=True)
-        except git.exc.InvalidGitRepositoryError:
-            pass
-        if repo:
-            path = repo.working_tree_dir
-            if os.path.exists("/".join([path, "core/constants.py"])):
-                self.working_area = path
-                self.log.debug(f"-> Working area is: {self.working_area}")
+        self.working_area = _find_working_area(os.getcwd())
+        if self.working_area:
+            self.log.debug(f"-> Working area is: {self.working_area}")
         if not self.working_area:
             msg = (
                 "Invalid working area. "
@@ -350,6 +431,8 @@ class Config:
             return path
 
     def dump_to_file(self, config_file="config.yaml"):
+        import yaml
+
         config_path = "/".join([self.output_area, config_file])
         with open(config_path, "w") as yaml_dump_file:
             options_values = {
@@ -376,10 +459,96 @@ class Config:
             return
         self._frozen = True
         self.log.debug("-> Freezing options. No additional changes possible.")
+        self._snapshot = _make_snapshot(
+            {
+                key: getattr(self, key)
+                for key in [*self.options(), *self._snapshot_members]
+            }
+        )
         if dump_to_file:
             self.log.debug("--> Dumping options to file.")
             self.dump_to_file()
 
     def _unfreeze(self):
         self._frozen = False
+        self._snapshot = None
         self.log.debug("-> Unfreezing options. Additional changes possible.")
+
+    # members of the snapshot besides the options
+    _snapshot_members = [
+        "_model_name",
+        "_action",
+        "output_area",
+        "working_area",
+    ]
+
+    def snapshot(self) -> "ConfigSnapshot":
+        """
+        Immutable copy of the frozen config, faster to read.
+        """
+        if not self._frozen:
+            msg = "Config must be frozen to take a snapshot."
+            self.log.error(msg)
+            raise ValueError(msg)
+        return self._snapshot
+
+
+class ConfigSnapshot:
+    """
+    Base class of the immutable config snapshots.
+    The values are stored in slots, one per member.
+    The snapshots can be pickled and sent to worker processes,
+    where they are used without configuring the config again.
+    """
+
+    __slots__ = ()
+
+    @property
+    def log(self):
+        return logging.getLogger("metahep")
+
+    def __reduce__(self):
+        # rebuilt from the values, e.g. in a worker process
+        return (
+            _make_snapshot,
+            ({key: getattr(self, key) for key in self.__slots__},),
+        )
+
+    def __setattr__(self, key, value):
+        raise AttributeError(
+            f"Config snapshot is immutable. Tried setting '{key}': '{value}'"
+        )
+
+    def __delattr__(self, key):
+        raise AttributeError(
+            f"Config snapshot is immutable. Tried deleting '{key}'."
+        )
+
+
+@lru_cache(maxsize=None)
+def _snapshot_type(members: tuple) -> type:
+    return type("ConfigSnapshot", (ConfigSnapshot,), {"__slots__": members})
+
+
+def _make_snapshot(values: dict) -> ConfigSnapshot:
+    snapshot = object.__new__(_snapshot_type(tuple(values)))
+    for key, value in values.items():
+        object.__setattr__(snapshot, key, value)
+    return snapshot
+
+
+@lru_cache(maxsize=None)
+def _find_working_area(path: str):
+    """
+    Returns the root of the git repository containing the path,
+    if it is the project repository.
+    """
+    while True:
+        if os.path.exists(os.path.join(path, ".git")):
+            if os.path.exists(os.path.join(path, "core/constants.py")):
+                return path
+            return None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
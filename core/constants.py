@@ -11,4 +11,6 @@ POSSIBLE_ACTIONS = [
     "generate",
     "convert",
     "evaluate",
+    "transcode",
+    "predict",
 ]
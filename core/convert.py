@@ -1,11 +1,33 @@
+import os
 from datetime import datetime
 import click
 
 from core.config import Config
-from core.utils import add_options
+from core.metrics import log_metrics, timed
+from core.model import model_commands
+from core.onnx_runtime import (
+    benchmark_keras,
+    benchmark_session,
+    check_parity,
+    compare_sessions,
+    create_session,
+    generate_calibration_reader,
+    optimize_model,
+    quantize_model,
+    take_inputs,
+    write_onnx_benchmark,
+)
+from core.utils import LazyGroup, add_options
 
 
-def convert(full_model):
+def convert(full_model, test_dataset=None, calibration_dataset=None):
+    """
+    The model can also be given as a function building it.
+    The unbatched test dataset gives the inputs of the comparison with
+    the Keras model and of the onnxruntime benchmark, so its inputs
+    must be the ones of the converted model. The unbatched calibration
+    dataset is needed by the static quantization.
+    """
     import tf2onnx
 
     config = Config()
@@ -19,12 +41,72 @@ def convert(full_model):
         msg = "No model to convert provided."
         config.log.error(msg)
         raise FileNotFoundError(msg)
-    full_model.load_weights(config.converter_model_path).expect_partial()
-    tf2onnx.convert.from_keras(
-        full_model.decoder,  # TODO: fix this
-        output_path=f"{config.output_area}/model.onnx",
-        opset=18,
-    )
+    if config.onnx_quantization == "static" and calibration_dataset is None:
+        msg = "The static quantization needs a calibration dataset."
+        config.log.error(msg)
+        raise ValueError(msg)
+    onnx_path = os.path.join(config.output_area, "model.onnx")
+    with timed("convert"):
+        if callable(full_model) and not hasattr(full_model, "fit"):
+            config.log.debug("-> Building the model.")
+            full_model = full_model()
+            config.log.debug("--> Done.")
+        full_model.load_weights(config.converter_model_path).expect_partial()
+        model = full_model
+        if config.converter_submodel:
+            config.log.debug(
+                f"--> Converting the '{config.converter_submodel}' submodel."
+            )
+            model = getattr(full_model, config.converter_submodel)
+        tf2onnx.convert.from_keras(
+            model,
+            output_path=onnx_path,
+            opset=config.converter_opset,
+        )
+    artifacts = {}
+    if config.onnx_optimization_level != "none":
+        config.log.info(
+            "-> Optimizing the ONNX model at the "
+            f"'{config.onnx_optimization_level}' level."
+        )
+        artifacts["optimized"] = os.path.join(
+            config.output_area, "model.optimized.onnx"
+        )
+        with timed("onnx_optimization"):
+            optimize_model(
+                onnx_path,
+                artifacts["optimized"],
+                config.onnx_optimization_level,
+            )
+    if config.onnx_quantization != "none":
+        config.log.info(
+            f"-> Quantizing the ONNX model ({config.onnx_quantization})."
+        )
+        name = f"{config.onnx_quantization}_int8"
+        artifacts[name] = os.path.join(
+            config.output_area, f"model.{name}.onnx"
+        )
+        calibration_reader = None
+        if config.onnx_quantization == "static":
+            if config.batched_decoding:
+                calibration_dataset = calibration_dataset.unbatch()
+            calibration_inputs, _ = take_inputs(
+                calibration_dataset, config.onnx_calibration_samples
+            )
+            calibration_reader = generate_calibration_reader(
+                onnx_path, calibration_inputs, config.batch_size
+            )
+        with timed("onnx_quantization", mode=config.onnx_quantization):
+            quantize_model(
+                onnx_path,
+                artifacts[name],
+                config.onnx_quantization,
+                calibration_reader,
+            )
+    if config.onnx_benchmark or (
+        test_dataset is not None and config.onnx_parity_samples
+    ):
+        _check_onnx_model(config, model, onnx_path, test_dataset, artifacts)
     config.log.info(
         f"-> Finished model conversion for the '{config._model_name}' model."
     )
@@ -32,15 +114,89 @@ def convert(full_model):
     config.log.info(f"--> Took: {datetime.now() - start_time} h.")
 
 
+def _check_onnx_model(
+    config, model, onnx_path: str, test_dataset, artifacts: dict
+) -> None:
+    import numpy as np
+
+    inputs = None
+    targets = None
+    if test_dataset is not None:
+        if config.batched_decoding:
+            test_dataset = test_dataset.unbatch()
+        inputs, targets = take_inputs(
+            test_dataset, max(config.onnx_parity_samples, 1)
+        )
+    results = {}
+    if inputs is None:
+        config.log.warning(
+            "--> No test samples. The benchmark runs on zeros "
+            "and the unknown input dimensions are set to 1."
+        )
+        inputs = tuple(
+            np.zeros(
+                [1] + [dim or 1 for dim in model_input.shape[1:]],
+                dtype=model_input.dtype.as_numpy_dtype,
+            )
+            for model_input in model.inputs
+        )
+        if len(inputs) == 1:
+            inputs = inputs[0]
+    elif config.onnx_parity_samples:
+        config.log.info("-> Comparing the ONNX model with the Keras model.")
+        session = create_session(onnx_path)
+        parity = check_parity(session, model, inputs)
+        log = config.log.info if parity["passed"] else config.log.error
+        log(
+            f"--> {'Passed' if parity['passed'] else 'Failed'} on "
+            f"{parity['samples']} samples: max. absolute difference "
+            f"{parity['max_abs_diff']:.3g}, max. relative difference "
+            f"{parity['max_rel_diff']:.3g}."
+        )
+        log_metrics("onnx_parity", **parity)
+        results["parity"] = parity
+        for name, path in artifacts.items():
+            comparison = compare_sessions(
+                session, create_session(path), inputs, targets
+            )
+            config.log.info(
+                f"--> {name}: max. absolute difference "
+                f"{comparison['max_abs_diff']:.3g} with the converted model."
+            )
+            delta = comparison.get("target_mean_abs_error_delta")
+            if delta is not None:
+                config.log.info(
+                    f"--> {name}: mean absolute error on the targets "
+                    f"changed by {delta:+.3g}."
+                )
+            log_metrics("onnx_comparison", artifact=name, **comparison)
+            results.setdefault("artifacts", {})[name] = {
+                "path": path,
+                "comparison": comparison,
+            }
+    if config.onnx_benchmark:
+        config.log.info("-> Benchmarking the ONNX model with onnxruntime.")
+        results["benchmark"] = benchmark_session(onnx_path, inputs)
+        for name, path in artifacts.items():
+            config.log.info(f"-> Benchmarking the {name} ONNX model.")
+            results.setdefault("artifacts", {}).setdefault(
+                name, {"path": path}
+            )["benchmark"] = benchmark_session(path, inputs)
+        results["keras_benchmark"] = benchmark_keras(model, inputs)
+    write_onnx_benchmark(config, results)
+
+
 def converter_cli_generator():
     @click.group(
         name="convert",
+        cls=LazyGroup,
+        lazy_commands=model_commands(),
         context_settings={"show_default": True},
     )
     @add_options(mode="converter")
     def generate_cli(*_, **kwargs):
         """
-        Generate the datasets.
+        Convert the model to ONNX.
         """
         config = Config()
         config.set_action("convert")
@@ -1,15 +1,31 @@
 import os
-from core.config import Config
+import json
+import hashlib
+import itertools
+import time
+from collections import deque
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from core.config import Config, ConfigSnapshot
+from core.metrics import timed
+from core.utils import get_worker_info, get_global_batch_size
 
+MANIFEST_FILE = "manifest.json"
+# used when the size of the elements cannot be known
+DEFAULT_SHUFFLE_BUFFER_SIZE = 1024
 
-def generate_tfrecord_dataloader(decoder, datatype: str):
+
+def generate_tfrecord_dataloader(decoder, datatype: str, config=None):
+    """
+    The config can be a frozen config snapshot,
+    e.g. to build the dataloader in a worker process.
+    """
     import tensorflow as tf
 
-    config = Config()
+    config = config or Config()
 
     def dataloader() -> tf.data.Dataset:
         files_dir = getattr(config, f"tfrecord_{datatype}_files")
-        files = []
         if not files_dir or not os.path.isdir(files_dir):
             msg = (
                 f"TFRecord directory '{files_dir}' for"
@@ -17,34 +33,398 @@ def generate_tfrecord_dataloader(decoder, datatype: str):
             )
             config.log.error(msg)
             raise FileNotFoundError(msg)
-        for file_name in os.listdir(files_dir):
-            if file_name.endswith(".tf"):
-                files.append(os.path.join(files_dir, file_name))
+        manifest = read_tfrecord_manifest(files_dir)
+        # sorted, as the listing order depends on the filesystem
+        listed_files = [
+            os.path.join(files_dir, file_name)
+            for file_name in sorted(os.listdir(files_dir))
+            if file_name.endswith(".tf")
+        ]
+        files = listed_files
+        records = None
+        if manifest:
+            files, records = _check_manifest(config, files_dir, manifest)
+            unlisted = sorted(set(listed_files) - set(files))
+            if unlisted:
+                config.log.warning(
+                    f"--> {len(unlisted)} TFRecord file(s) in '{files_dir}' "
+                    f"not in the manifest, e.g. '{unlisted[0]}'. Reading "
+                    "all the files, without the numbers of records."
+                )
+                files = listed_files
+                records = None
+        else:
+            config.log.debug(
+                f"--> No manifest in '{files_dir}'. Listing the files."
+            )
         if not files:
             msg = f"No TFRecord files found in '{files_dir}'."
             config.log.error(msg)
             raise FileNotFoundError(msg)
-        return tf.data.TFRecordDataset(
-            files,
-            buffer_size=config.tfrecord_buffer_size,
-            num_parallel_reads=config.tfrecord_num_parallel_reads,
-            compression_type=config.tfrecord_compression_type,
-        ).map(decoder)
+        worker_index, workers_no = get_worker_info(config)
+        shard_records = False
+        if workers_no > 1:
+            if len(files) >= workers_no:
+                config.log.debug(
+                    f"--> Sharding the '{datatype}' files "
+                    f"for worker {worker_index} of {workers_no}."
+                )
+                if records:
+                    shards = _balance_shards(records, workers_no)
+                    _check_records_balance(config, datatype, records, shards)
+                    files = [files[index] for index in shards[worker_index]]
+                    records = [
+                        records[index] for index in shards[worker_index]
+                    ]
+                else:
+                    _check_shards_balance(config, datatype, files, workers_no)
+                    files = files[worker_index::workers_no]
+            else:
+                config.log.debug(
+                    f"--> Fewer '{datatype}' files than workers. Sharding "
+                    f"the records for worker {worker_index} of {workers_no}."
+                )
+                shard_records = True
+        records_no = None
+        if records is not None:
+            records_no = sum(records)
+            if shard_records:
+                records_no = len(range(worker_index, records_no, workers_no))
+        num_parallel_calls = _autotune(config.tfrecord_num_parallel_calls)
+        # the workers must read the records in the same order before
+        # sharding them, or their shards overlap; shuffled afterwards
+        deterministic = config.tfrecord_deterministic or shard_records
+        files_dataset = tf.data.Dataset.from_tensor_slices(files)
+        if _shuffled(config, datatype) and not shard_records:
+            files_dataset = files_dataset.shuffle(
+                len(files),
+                seed=config.shuffle_seed,
+                reshuffle_each_iteration=True,
+            )
+        if config.tfrecord_interleave_cycle_length:
+            cycle_length = _autotune(config.tfrecord_interleave_cycle_length)
+            # tf.data requires no more parallel calls than a fixed
+            # cycle length, so both are tuned if either one is
+            interleave_parallel_calls = tf.data.AUTOTUNE
+            if tf.data.AUTOTUNE not in (cycle_length, num_parallel_calls):
+                interleave_parallel_calls = min(
+                    cycle_length, num_parallel_calls
+                )
+            dataset = files_dataset.interleave(
+                lambda file: tf.data.TFRecordDataset(
+                    file,
+                    buffer_size=config.tfrecord_buffer_size,
+                    compression_type=config.tfrecord_compression_type,
+                ),
+                cycle_length=cycle_length,
+                block_length=config.tfrecord_interleave_block_length,
+                num_parallel_calls=interleave_parallel_calls,
+                deterministic=deterministic,
+            )
+        else:
+            dataset = tf.data.TFRecordDataset(
+                files_dataset,
+                buffer_size=config.tfrecord_buffer_size,
+                num_parallel_reads=_autotune(
+                    config.tfrecord_num_parallel_reads
+                ),
+                compression_type=config.tfrecord_compression_type,
+            )
+        if shard_records:
+            dataset = dataset.shard(workers_no, worker_index)
+        if records_no is not None:
+            # known from the manifest, so that Keras can size the epochs
+            dataset = dataset.apply(
+                tf.data.experimental.assert_cardinality(records_no)
+            )
+        options = tf.data.Options()
+        if workers_no > 1:
+            # already sharded, the distribution strategy must not do it again
+            options.experimental_distribute.auto_shard_policy = (
+                tf.data.experimental.AutoShardPolicy.OFF
+            )
+        if not deterministic:
+            options.deterministic = False
+        dataset = dataset.with_options(options)
+        if config.batched_decoding:
+            # shuffled record by record before the batches are decoded,
+            # so the serialized records are cached
+            dataset = _cache_and_shuffle(config, dataset, datatype, files)
+            # the decoder gets whole batches of serialized records
+            dataset = dataset.batch(get_global_batch_size(config))
+        dataset = dataset.map(
+            decoder,
+            num_parallel_calls=num_parallel_calls,
+            deterministic=config.tfrecord_deterministic,
+        )
+        if config.batched_decoding:
+            return dataset
+        return _cache_and_shuffle(config, dataset, datatype, files)
 
     return dataloader
 
 
-def generate_tfrecord_datagenerator(encoder, datatype: str):
+def _shuffled(config, datatype: str) -> bool:
+    """
+    Only the training data is shuffled, so that the evaluation and the
+    predictions follow the order of the files.
+    """
+    return config.shuffle and datatype == "training"
+
+
+def _cache_and_shuffle(config, dataset, datatype: str, files: list):
+    shuffle = _shuffled(config, datatype)
+    if shuffle:
+        shuffle_buffer_size = _shuffle_buffer_size(config, dataset)
+    if config.dataset_cache == "memory":
+        config.log.debug(f"--> Caching '{datatype}' data in memory.")
+        dataset = dataset.cache()
+    elif config.dataset_cache and config.dataset_cache != "none":
+        cache_path = _dataset_cache_path(config, datatype, files)
+        config.log.debug(f"--> Caching '{datatype}' data in '{cache_path}'.")
+        dataset = dataset.cache(cache_path)
+    if shuffle:
+        if config.dataset_cache and config.dataset_cache != "none":
+            config.log.debug(
+                "--> The file order is frozen by the cache. "
+                "Only the records are reshuffled."
+            )
+        config.log.debug(
+            f"--> Shuffling '{datatype}' data "
+            f"with a buffer of {shuffle_buffer_size} elements."
+        )
+        dataset = dataset.shuffle(
+            shuffle_buffer_size,
+            seed=config.shuffle_seed,
+            reshuffle_each_iteration=True,
+        )
+    return dataset
+
+
+def read_tfrecord_manifest(files_dir: str):
+    """
+    Returns the manifest of the TFRecord directory, None if it has none.
+    """
+    path = os.path.join(files_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_tfrecord_manifest(
+    files_dir: str,
+    files: list,
+    compression_type: str,
+    compression_level,
+    input_shape=None,
+) -> None:
+    """
+    The files are (file_name, records, bytes) tuples. The manifest is
+    replaced atomically, so that a reader never sees it half written.
+    """
+    manifest = {
+        "compression_type": compression_type,
+        "compression_level": compression_level,
+        "input_shape": list(input_shape) if input_shape else None,
+        "records": sum(records for _, records, _ in files),
+        "files": [
+            {"name": name, "records": records, "bytes": size}
+            for name, records, size in sorted(files)
+        ],
+    }
+    path = os.path.join(files_dir, MANIFEST_FILE)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def _check_manifest(config, files_dir: str, manifest: dict) -> tuple:
+    """
+    Checks the files of the manifest against the config and the disk,
+    and returns their paths and numbers of records.
+    """
+    if manifest["compression_type"] != config.tfrecord_compression_type:
+        msg = (
+            f"The TFRecord files in '{files_dir}' are compressed with "
+            f"'{manifest['compression_type']}', not with "
+            f"'{config.tfrecord_compression_type}'."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+    input_shape = getattr(config, "input_shape", None)
+    if (
+        manifest["input_shape"]
+        and input_shape
+        and list(manifest["input_shape"]) != list(input_shape)
+    ):
+        msg = (
+            f"The TFRecord files in '{files_dir}' have the input shape "
+            f"{tuple(manifest['input_shape'])}, not {tuple(input_shape)}."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+    files = []
+    records = []
+    for entry in manifest["files"]:
+        path = os.path.join(files_dir, entry["name"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["bytes"]:
+            msg = (
+                f"The TFRecord file '{path}' is missing or differs "
+                "from the manifest."
+            )
+            config.log.error(msg)
+            raise FileNotFoundError(msg)
+        files.append(path)
+        records.append(entry["records"])
+    return files, records
+
+
+def _balance_shards(records: list, workers_no: int) -> list:
+    """
+    Assigns the files to the workers, the biggest first to the worker
+    with the fewest records. Deterministic, so that every worker
+    computes the same assignment.
+    """
+    shards = [[] for _ in range(workers_no)]
+    totals = [0] * workers_no
+    for index in sorted(
+        range(len(records)), key=lambda index: (-records[index], index)
+    ):
+        worker = totals.index(min(totals))
+        shards[worker].append(index)
+        totals[worker] += records[index]
+    return [sorted(shard) for shard in shards]
+
+
+def _check_records_balance(
+    config, datatype: str, records: list, shards: list
+) -> None:
+    totals = [sum(records[index] for index in shard) for shard in shards]
+    if max(totals) > 1.5 * min(totals):
+        config.log.error(
+            f"The '{datatype}' shards are badly unbalanced: "
+            f"from {min(totals)} to {max(totals)} records per worker."
+        )
+
+
+def _check_shards_balance(
+    config, datatype: str, files: list, workers_no: int
+) -> None:
+    sizes = [
+        sum(os.path.getsize(file) for file in files[index::workers_no])
+        for index in range(workers_no)
+    ]
+    if max(sizes) > 1.5 * min(sizes):
+        config.log.error(
+            f"The '{datatype}' shards are badly unbalanced: "
+            f"from {min(sizes)} to {max(sizes)} bytes per worker."
+        )
+
+
+def _dataset_cache_path(config, datatype: str, files: list) -> str:
+    key = {
+        "files": [(file, os.path.getmtime(file)) for file in sorted(files)],
+        "input_shape": list(getattr(config, "input_shape", None) or []),
+        # the serialized records are cached with the batched decoding
+        "batched_decoding": config.batched_decoding,
+        "worker": get_worker_info(config),
+    }
+    digest = hashlib.sha256(
+        json.dumps(key, sort_keys=True).encode()
+    ).hexdigest()[:16]
+    if not os.path.exists(config.dataset_cache):
+        os.makedirs(config.dataset_cache)
+    return os.path.join(config.dataset_cache, f"{datatype}_{digest}")
+
+
+def _shuffle_buffer_size(config, dataset) -> int:
+    """
+    Keeps the buffer within the memory budget, based on the size of the
+    elements. It is read from the element spec if the shapes are fully
+    known, otherwise from the first element, which reads the start of
+    the pipeline once. The default size is used for an empty dataset.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    if config.shuffle_buffer_size:
+        return config.shuffle_buffer_size
+    specs = tf.nest.flatten(dataset.element_spec)
+    # the size of the strings, e.g. serialized records, is not known
+    if all(
+        spec.shape.is_fully_defined() and spec.dtype != tf.string
+        for spec in specs
+    ):
+        element_size = sum(
+            int(np.prod(spec.shape)) * spec.dtype.size for spec in specs
+        )
+    else:
+        element = next(iter(dataset.take(1)), None)
+        if element is None:
+            config.log.warning(
+                "--> Empty dataset. Default shuffle buffer size: "
+                f"{DEFAULT_SHUFFLE_BUFFER_SIZE}."
+            )
+            return DEFAULT_SHUFFLE_BUFFER_SIZE
+        element_size = sum(
+            np.asarray(tensor.numpy()).nbytes
+            for tensor in tf.nest.flatten(element)
+        )
+    memory = config.shuffle_buffer_memory * 1024**2
+    return max(1, memory // max(1, element_size))
+
+
+def _autotune(value):
     import tensorflow as tf
 
-    config = Config()
+    if value == "AUTOTUNE":
+        return tf.data.AUTOTUNE
+    return value
+
+
+def _write_tfrecord_file(file_path, examples, config) -> int:
+    import tensorflow as tf
+
+    tf_file_options = tf.io.TFRecordOptions(
+        compression_type=config.tfrecord_compression_type,
+        compression_level=config.tfrecord_compression_level,
+    )
+    records = 0
+    with tf.io.TFRecordWriter(file_path, options=tf_file_options) as writer:
+        for example in examples:
+            writer.write(_serialize_example(example))
+            records += 1
+    return records
+
+
+def _serialize_example(example) -> bytes:
+    if isinstance(example, bytes):
+        return example
+    return example.SerializeToString()
+
+
+def _wait_for_tfrecord_file(config, file_path, future) -> tuple:
+    records = future.result()
+    config.log.debug(f"--> Written to tfrecord_file: '{file_path}.'")
+    return os.path.basename(file_path), records, os.path.getsize(file_path)
+
+
+def generate_tfrecord_datagenerator(encoder, datatype: str, config=None):
+    """
+    The encoder yields (file_name, examples) pairs, with the examples
+    as any iterable of tf.train.Example or of already serialized bytes.
+    With thread workers, the examples are consumed lazily by the writer,
+    so a generator keeps only one example at a time in memory.
+    With process workers, they are serialized into a list first.
+
+    The config can be a frozen config snapshot. The writer processes
+    always get the snapshot, so the config must be frozen to use them.
+    """
+    config = config or Config()
 
     def generator() -> None:
         config.log.debug(f"-> Generating tfrecord_file for '{datatype}' data.")
-        tf_file_options = tf.io.TFRecordOptions(
-            compression_type=config.tfrecord_compression_type,
-            compression_level=config.tfrecord_compression_level,
-        )
         dir = getattr(config, f"tfrecord_{datatype}_files")
         if not dir or not os.path.isdir(dir):
             msg = (
@@ -53,16 +433,396 @@ def generate_tfrecord_datagenerator(encoder, datatype: str):
             )
             config.log.error(msg)
             raise FileNotFoundError(msg)
-        for file_name, examples in encoder():
-            file_path = os.path.join(
-                getattr(config, f"tfrecord_{datatype}_files"),
-                file_name,
-            )
-            with tf.io.TFRecordWriter(
-                file_path, options=tf_file_options
-            ) as writer:
-                for example in examples:
-                    writer.write(example.SerializeToString())
-            config.log.debug(f"--> Written to tfrecord_file: '{file_path}.'")
+        workers_no = config.generator_workers
+        processes = config.generator_executor == "process"
+        if workers_no > 1 or processes:
+            config.log.debug(
+                f"--> Writing with {workers_no} {config.generator_executor} "
+                "worker(s)."
+            )
+        writer_config = config
+        if processes and not isinstance(config, ConfigSnapshot):
+            writer_config = config.snapshot()
+        # the i-th file is always written by the (i % workers_no)-th worker,
+        # so that reruns give the same shards per worker
+        if processes:
+            workers = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                for _ in range(workers_no)
+            ]
+        else:
+            workers = [
+                ThreadPoolExecutor(
+                    max_workers=1,
+                    thread_name_prefix=f"tfrecord_writer_{worker_no}",
+                )
+                for worker_no in range(workers_no)
+            ]
+        # the files already there, to be kept in the manifest
+        existing = [
+            file_name
+            for file_name in os.listdir(dir)
+            if file_name.endswith(".tf")
+        ]
+        pending = deque()
+        written = []
+        try:
+            with timed(
+                "generate_tfrecords",
+                config=config,
+                datatype=datatype,
+                files=0,
+                bytes=0,
+            ) as metrics:
+                start_time = time.perf_counter()
+                for file_no, (file_name, examples) in enumerate(encoder()):
+                    file_path = os.path.join(dir, file_name)
+                    if processes:
+                        # sent to the process already serialized
+                        examples = [
+                            _serialize_example(example) for example in examples
+                        ]
+                    pending.append(
+                        (
+                            file_path,
+                            workers[file_no % workers_no].submit(
+                                _write_tfrecord_file,
+                                file_path,
+                                examples,
+                                writer_config,
+                            ),
+                        )
+                    )
+                    # do not let the encoder run too far ahead of the writers
+                    while len(pending) > 2 * workers_no:
+                        written.append(
+                            _wait_for_tfrecord_file(config, *pending.popleft())
+                        )
+                while pending:
+                    written.append(
+                        _wait_for_tfrecord_file(config, *pending.popleft())
+                    )
+                metrics["files"] = len(written)
+                metrics["bytes"] = sum(size for *_, size in written)
+                metrics["megabytes_per_second"] = (
+                    metrics["bytes"]
+                    / 1024**2
+                    / (time.perf_counter() - start_time)
+                )
+            update_tfrecord_manifest(
+                config,
+                dir,
+                existing,
+                written,
+                config.tfrecord_compression_type,
+                config.tfrecord_compression_level,
+                getattr(config, "input_shape", None),
+            )
+        finally:
+            for worker in workers:
+                worker.shutdown(cancel_futures=True)
+
+    return generator
+
+
+def update_tfrecord_manifest(
+    config,
+    files_dir: str,
+    existing: list,
+    written: list,
+    compression_type: str,
+    compression_level,
+    input_shape=None,
+) -> None:
+    """
+    Writes the manifest of the written (file_name, records, bytes) files,
+    keeping the existing files already in the previous manifest.
+    No manifest is written if some existing files are unknown to it.
+    """
+    manifest = read_tfrecord_manifest(files_dir)
+    files = {name: (name, records, size) for name, records, size in written}
+    if existing:
+        if not manifest or (manifest["compression_type"] != compression_type):
+            config.log.warning(
+                f"--> No manifest written, as '{files_dir}' already has "
+                "TFRecord files without a matching manifest."
+            )
+            return
+        for entry in manifest["files"]:
+            if entry["name"] in existing and entry["name"] not in files:
+                files[entry["name"]] = (
+                    entry["name"],
+                    entry["records"],
+                    entry["bytes"],
+                )
+        if set(existing) - set(files):
+            config.log.warning(
+                f"--> No manifest written, as '{files_dir}' already has "
+                "TFRecord files missing from its manifest."
+            )
+            return
+    write_tfrecord_manifest(
+        files_dir,
+        list(files.values()),
+        compression_type,
+        compression_level,
+        input_shape,
+    )
+    config.log.debug(f"--> Written the manifest of '{files_dir}'.")
+
+
+def generate_npy_dataloader(datatype: str, config=None):
+    """
+    Reads the shards written by the npy data generator or converter.
+    A shard is a set of '<shard>.<index>.npy' files, one per component
+    of the dataset elements, with the elements stacked along the first
+    axis. The files are memory mapped and sliced in chunks, so only
+    the chunks in flight are read from the disk.
+
+    The config can be a frozen config snapshot,
+    e.g. to build the dataloader in a worker process.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    config = config or Config()
+
+    def dataloader() -> tf.data.Dataset:
+        files_dir = getattr(config, f"npy_{datatype}_files")
+        if not files_dir or not os.path.isdir(files_dir):
+            msg = (
+                f"npy directory '{files_dir}' for"
+                f" datatype '{datatype}' does not exist."
+            )
+            config.log.error(msg)
+            raise FileNotFoundError(msg)
+        shards = _list_npy_shards(files_dir)
+        if not shards:
+            msg = f"No npy shards found in '{files_dir}'."
+            config.log.error(msg)
+            raise FileNotFoundError(msg)
+        worker_index, workers_no = get_worker_info(config)
+        shard_records = False
+        if workers_no > 1:
+            if len(shards) >= workers_no:
+                config.log.debug(
+                    f"--> Sharding the '{datatype}' shards "
+                    f"for worker {worker_index} of {workers_no}."
+                )
+                _check_shards_balance(
+                    config,
+                    datatype,
+                    [shard[0] for shard in shards],
+                    workers_no,
+                )
+                shards = shards[worker_index::workers_no]
+            else:
+                config.log.debug(
+                    f"--> Fewer '{datatype}' shards than workers. Sharding "
+                    f"the records for worker {worker_index} of {workers_no}."
+                )
+                shard_records = True
+        signature = tuple(
+            tf.TensorSpec((None,) + array.shape[1:], tf.as_dtype(array.dtype))
+            for array in _load_npy_shard(config, shards[0])
+        )
+        chunk_size = config.npy_chunk_size
+        epochs = itertools.count()
+
+        def chunks():
+            order = range(len(shards))
+            # the workers must read the records in the same order before
+            # sharding them, or their shards overlap; shuffled afterwards
+            if _shuffled(config, datatype) and not shard_records:
+                seed = config.shuffle_seed
+                if seed is not None:
+                    # reshuffled every epoch, but reproducible
+                    seed = (seed, next(epochs))
+                order = np.random.default_rng(seed).permutation(len(shards))
+            for index in order:
+                arrays = _load_npy_shard(config, shards[index])
+                for array, spec in zip(arrays, signature):
+                    if array.shape[1:] != tuple(spec.shape[1:]):
+                        msg = (
+                            f"The shard '{shards[index][0]}' has elements "
+                            f"of shape {array.shape[1:]} instead of "
+                            f"{tuple(spec.shape[1:])}."
+                        )
+                        config.log.error(msg)
+                        raise ValueError(msg)
+                for start in range(0, len(arrays[0]), chunk_size):
+                    end = start + chunk_size
+                    # views of the mapped files, read on demand
+                    yield tuple(array[start:end] for array in arrays)
+
+        dataset = tf.data.Dataset.from_generator(
+            chunks, output_signature=signature
+        ).unbatch()
+        if shard_records:
+            dataset = dataset.shard(workers_no, worker_index)
+        options = tf.data.Options()
+        if workers_no > 1:
+            # already sharded, the distribution strategy must not do it again
+            options.experimental_distribute.auto_shard_policy = (
+                tf.data.experimental.AutoShardPolicy.OFF
+            )
+        dataset = dataset.with_options(options)
+        files = [file for shard in shards for file in shard]
+        dataset = _cache_and_shuffle(config, dataset, datatype, files)
+        if config.batched_decoding:
+            # the datasets are expected to be batched by the dataloader
+            dataset = dataset.batch(get_global_batch_size(config))
+        return dataset
+
+    return dataloader
+
+
+def _list_npy_shards(files_dir: str) -> list:
+    shards = {}
+    for file_name in os.listdir(files_dir):
+        name, _, extension = file_name.rpartition(".npy")
+        shard, _, index = name.rpartition(".")
+        if extension or not shard or not index.isdigit():
+            continue
+        shards.setdefault(shard, {})[int(index)] = os.path.join(
+            files_dir, file_name
+        )
+    # sorted, as the listing order depends on the filesystem
+    return [
+        [components[index] for index in sorted(components)]
+        for _, components in sorted(shards.items())
+    ]
+
+
+def _load_npy_shard(config, shard: list) -> list:
+    import numpy as np
+
+    arrays = [np.load(file, mmap_mode="r") for file in shard]
+    if len({len(array) for array in arrays}) > 1:
+        msg = (
+            f"The components of the shard '{shard[0]}' "
+            "have different numbers of elements."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+    return arrays
+
+
+def _write_npy_shard(files_dir: str, shard: str, arrays) -> int:
+    import numpy as np
+
+    size = 0
+    for index, array in enumerate(arrays):
+        file_path = os.path.join(files_dir, f"{shard}.{index}.npy")
+        np.save(file_path, np.ascontiguousarray(array))
+        size += os.path.getsize(file_path)
+    return size
+
+
+def generate_npy_datagenerator(encoder, datatype: str, config=None):
+    """
+    The encoder yields (shard_name, arrays) pairs, with one array
+    per component of the dataset elements, stacked along the first axis.
+    """
+    config = config or Config()
+
+    def generator() -> None:
+        config.log.debug(f"-> Generating npy shards for '{datatype}' data.")
+        dir = getattr(config, f"npy_{datatype}_files")
+        if not dir or not os.path.isdir(dir):
+            msg = (
+                f"npy directory '{dir}' does not exist. "
+                "Please create it manually."
+            )
+            config.log.error(msg)
+            raise FileNotFoundError(msg)
+        with timed(
+            "generate_npy",
+            config=config,
+            datatype=datatype,
+            files=0,
+            bytes=0,
+        ) as metrics:
+            for shard, arrays in encoder():
+                metrics["bytes"] += _write_npy_shard(dir, shard, arrays)
+                metrics["files"] += 1
+                config.log.debug(f"--> Written the npy shard: '{shard}'.")
 
     return generator
+
+
+def generate_npy_converter(decoder, datatype: str, config=None):
+    """
+    Converts the TFRecord files of the datatype into npy shards,
+    one shard per TFRecord file, decoded with the given decoder.
+    The decoded elements must have a fixed shape.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    config = config or Config()
+
+    def converter() -> None:
+        tfrecord_dir = getattr(config, f"tfrecord_{datatype}_files")
+        npy_dir = getattr(config, f"npy_{datatype}_files")
+        for files_dir in [tfrecord_dir, npy_dir]:
+            if not files_dir or not os.path.isdir(files_dir):
+                msg = (
+                    f"Directory '{files_dir}' for"
+                    f" datatype '{datatype}' does not exist."
+                )
+                config.log.error(msg)
+                raise FileNotFoundError(msg)
+        config.log.debug(
+            f"-> Converting the '{datatype}' TFRecord files "
+            f"from '{tfrecord_dir}' to npy shards in '{npy_dir}'."
+        )
+        files = [
+            file_name
+            for file_name in sorted(os.listdir(tfrecord_dir))
+            if file_name.endswith(".tf")
+        ]
+        with timed(
+            "convert_npy",
+            config=config,
+            datatype=datatype,
+            files=0,
+            bytes=0,
+        ) as metrics:
+            for file_name in files:
+                dataset = tf.data.TFRecordDataset(
+                    os.path.join(tfrecord_dir, file_name),
+                    buffer_size=config.tfrecord_buffer_size,
+                    compression_type=config.tfrecord_compression_type,
+                )
+                if config.batched_decoding:
+                    dataset = dataset.batch(config.npy_chunk_size)
+                dataset = dataset.map(
+                    decoder, num_parallel_calls=tf.data.AUTOTUNE
+                )
+                if config.batched_decoding:
+                    dataset = dataset.unbatch()
+                components = None
+                for element in dataset.as_numpy_iterator():
+                    if not isinstance(element, tuple):
+                        element = (element,)
+                    if components is None:
+                        components = [[] for _ in element]
+                    for component, array in zip(components, element):
+                        component.append(array)
+                if components is None:
+                    config.log.warning(f"--> Skipped the empty '{file_name}'.")
+                    continue
+                metrics["bytes"] += _write_npy_shard(
+                    npy_dir,
+                    file_name[: -len(".tf")],
+                    [np.stack(component) for component in components],
+                )
+                metrics["files"] += 1
+                config.log.debug(f"--> Converted '{file_name}'.")
+        config.log.debug("--> Done.")
+
+    return converter
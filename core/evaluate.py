@@ -1,51 +1,246 @@
+import os
+import csv
+import glob
+import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import click
 
 from core.config import Config
-from core.utils import add_options
+from core.metrics import log_metrics, timed
+from core.model import model_commands
+from core.utils import (
+    LazyGroup,
+    add_options,
+    get_global_batch_size,
+    set_precision_policy,
+)
+
+EVALUATION_FILE = "evaluation.csv"
 
 
 def evaluate(
     model,
-    evaluate,
+    loss,
     test_dataset,
+    metrics=None,
 ):
-    # import tensorflow as tf
+    """
+    The model can also be given as a function building it. The loss
+    and the metrics are functions returning the loss function and
+    a list of Keras metrics. They are all accumulated in a single
+    streaming pass, so the memory does not grow with the test dataset.
 
+    Several checkpoints can be given in the model path. The test dataset
+    is then decoded once and cached, and the results are returned
+    and written as a comparison table, by model path.
+    """
     config = Config()
     config.check_readiness()
     start_time = datetime.now()
     config.log.info(f"-> Started evaluating the '{config._model_name}' model.")
     config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
-    config.log.debug("-> Model summary: ")
-    model.summary(print_fn=lambda x: config.log.debug(x))
-    config.log.debug("-> Loading weights: ")
-    if not config.model_path:
+    model_paths = expand_model_paths(config.model_path)
+    if not model_paths:
         msg = "No model weights provided."
         config.log.error(msg)
         raise FileNotFoundError(msg)
-    model.load_weights(config.model_path).expect_partial()
-    config.log.debug("--> Done.")
-    config.log.debug("-> Dataset preparation...")
-    config.log.debug("--> Done.")
-    config.log.debug("-> Evaluating...")
-    evaluate(model, test_dataset)
+    with timed("evaluate", checkpoints=len(model_paths)):
+        results = _evaluate(model, loss, test_dataset, metrics, model_paths)
+    _write_results(config, results)
     config.log.info(
         f"-> Finished evaluating the '{config._model_name}' model."
     )
     config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
     config.log.info(f"--> Took: {datetime.now() - start_time} h.")
+    return results
+
+
+def expand_model_paths(model_path) -> list:
+    """
+    Splits the comma separated paths and expands the glob patterns.
+    A pattern matching TensorFlow checkpoint files gives the checkpoint
+    prefixes, e.g. 'checkpoints/*.index' gives 'checkpoints/*'.
+    """
+    model_paths = []
+    for pattern in (model_path or "").split(","):
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            # a checkpoint prefix is not a file
+            matches = [pattern]
+        for match in matches:
+            if ".data-" in os.path.basename(match):
+                match = match[: match.rindex(".data-")]
+            elif match.endswith(".index"):
+                match = match[: -len(".index")]
+            if match not in model_paths:
+                model_paths.append(match)
+    return model_paths
+
+
+def _evaluate(model, loss, test_dataset, metrics, model_paths) -> dict:
+    import tensorflow as tf
+
+    config = Config()
+    set_precision_policy(config)
+    config.log.debug("-> Dataset preparation...")
+    if config.batched_decoding:
+        config.log.debug("--> Dataset already batched by the dataloader.")
+    else:
+        global_batch_size = get_global_batch_size(config)
+        config.log.debug(f"--> Global batch size: {global_batch_size}.")
+        test_dataset = test_dataset.batch(global_batch_size)
+    if len(model_paths) > 1 and config.dataset_cache == "none":
+        config.log.debug(
+            f"--> Caching the decoded data in memory "
+            f"for the {len(model_paths)} checkpoints."
+        )
+        test_dataset = test_dataset.cache()
+    test_dataset = test_dataset.prefetch(
+        buffer_size=tf.data.experimental.AUTOTUNE,
+    )
+    config.log.debug("--> Done.")
+    build = callable(model) and not hasattr(model, "fit")
+    workers_no = min(config.evaluation_workers, len(model_paths))
+    if workers_no > 1 and not build:
+        config.log.warning(
+            "--> The checkpoints are evaluated one by one, "
+            "as the model is not given as a function building it."
+        )
+        workers_no = 1
+
+    def load(model_path):
+        checkpoint_model = model
+        if build:
+            config.log.debug("-> Building the model.")
+            checkpoint_model = model()
+            config.log.debug("--> Done.")
+        config.log.debug(f"-> Loading weights: '{model_path}'.")
+        checkpoint_model.load_weights(model_path).expect_partial()
+        config.log.debug("--> Done.")
+        return checkpoint_model
+
+    first_model = load(model_paths[0])
+    config.log.debug("-> Model summary: ")
+    first_model.summary(print_fn=lambda x: config.log.debug(x))
+    # the first pass also fills the cache, before any parallel pass
+    results = {
+        model_paths[0]: _evaluate_model(
+            first_model, loss, test_dataset, metrics, model_paths[0]
+        )
+    }
+    if workers_no > 1:
+        config.log.debug(
+            f"-> Evaluating the checkpoints with {workers_no} threads."
+        )
+        # built and loaded in this thread, evaluated in parallel
+        models = [load(model_path) for model_path in model_paths[1:]]
+        with ThreadPoolExecutor(workers_no) as executor:
+            results.update(
+                zip(
+                    model_paths[1:],
+                    executor.map(
+                        lambda model_path, checkpoint_model: _evaluate_model(
+                            checkpoint_model,
+                            loss,
+                            test_dataset,
+                            metrics,
+                            model_path,
+                        ),
+                        model_paths[1:],
+                        models,
+                    ),
+                )
+            )
+    else:
+        for model_path in model_paths[1:]:
+            results[model_path] = _evaluate_model(
+                load(model_path), loss, test_dataset, metrics, model_path
+            )
+    return results
+
+
+def _evaluate_model(model, loss, test_dataset, metrics, model_path) -> dict:
+    import tensorflow as tf
+
+    config = Config()
+    loss_fn = loss()
+    mean_loss = tf.keras.metrics.Mean(name="loss")
+    metric_objects = [mean_loss] + (metrics() if metrics else [])
+    samples = tf.Variable(0, dtype=tf.int64)
+
+    def predict(x):
+        return tf.cast(model(x, training=False), tf.float32)
+
+    if config.jit_compile:
+        predict = tf.function(predict, jit_compile=True)
+
+    @tf.function
+    def evaluate_dataset(dataset):
+        # a single graph loop over the whole dataset
+        for x, y in dataset:
+            y = tf.cast(y, tf.float32)
+            y_pred = predict(x)
+            # weighted by the batch size, for a partial last batch
+            mean_loss.update_state(
+                loss_fn(y, y_pred),
+                sample_weight=tf.cast(tf.shape(y)[0], tf.float32),
+            )
+            for metric in metric_objects[1:]:
+                metric.update_state(y, y_pred)
+            samples.assign_add(tf.cast(tf.shape(x)[0], tf.int64))
+
+    config.log.debug(f"-> Evaluating '{model_path}'...")
+    start = time.perf_counter()
+    evaluate_dataset(test_dataset)
+    duration = time.perf_counter() - start
+    config.log.debug("--> Done.")
+    results = {
+        metric.name: float(metric.result()) for metric in metric_objects
+    }
+    results["samples"] = int(samples.numpy())
+    results["samples_per_second"] = results["samples"] / duration
+    log_metrics(
+        "evaluate_checkpoint", config=config, model_path=model_path, **results
+    )
+    return results
+
+
+def _write_results(config, results: dict) -> None:
+    """
+    Logs the comparison table and writes it to the evaluation file.
+    """
+    names = list(next(iter(results.values())))
+    config.log.info("-> Results:")
+    config.log.info(f"--> model_path | {' | '.join(names)}")
+    for model_path, values in results.items():
+        config.log.info(
+            f"--> {model_path} | "
+            + " | ".join(f"{values[name]:.6g}" for name in names)
+        )
+    with open(
+        os.path.join(config.output_area, EVALUATION_FILE), "w", newline=""
+    ) as f:
+        writer = csv.writer(f)
+        writer.writerow(["model_path"] + names)
+        for model_path, values in results.items():
+            writer.writerow([model_path] + [values[name] for name in names])
 
 
 def evaluate_cli_generator():
     @click.group(
         name="evaluate",
+        cls=LazyGroup,
+        lazy_commands=model_commands(),
         context_settings={"show_default": True},
     )
     @add_options(mode="evaluation")
     def evaluate_cli(*_, **kwargs):
         """
-        Train the model.
+        Evaluate the model.
         """
         config = Config()
         config.set_action("evaluate")
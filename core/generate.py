@@ -1,11 +1,18 @@
 from datetime import datetime
 import click
 
+from core.compression import benchmark_compression
 from core.config import Config
-from core.utils import add_options
+from core.metrics import timed
+from core.model import model_commands
+from core.utils import LazyGroup, add_options
 
 
-def generate(data_generator):
+def generate(data_generator, decoder=None):
+    """
+    The decoder is only used to read the records back
+    in the compression benchmark.
+    """
     config = Config()
     config.check_readiness()
     start_time = datetime.now()
@@ -13,7 +20,10 @@ def generate(data_generator):
         f"-> Started data generation for the '{config._model_name}' model."
     )
     config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
-    data_generator()
+    with timed("generate"):
+        data_generator()
+    if config.compression_benchmark:
+        benchmark_compression(decoder)
     config.log.info(
         f"-> Finished data generation for the '{config._model_name}' model."
     )
@@ -24,6 +34,8 @@ def generate(data_generator):
 def data_generator_cli_generator():
     @click.group(
         name="generate",
+        cls=LazyGroup,
+        lazy_commands=model_commands(),
         context_settings={"show_default": True},
     )
     @add_options(mode="data_generator")
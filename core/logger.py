@@ -1,5 +1,8 @@
-import logging
 import sys
+import queue
+import atexit
+import logging
+import logging.handlers
 
 
 class CustomFormatter(logging.Formatter):
@@ -21,24 +24,47 @@ class CustomFormatter(logging.Formatter):
     def __init__(self, *args, prefix_format="", **kwargs):
         super().__init__(*args, **kwargs)
         self.prefix_format = prefix_format
+        # one formatter per level, built on first use
+        self.formatters = {}
 
     def format(self, record):
-        log_fmt = (
-            f"{self.FORMATS.get(record.levelno)}"
-            f"{self.prefix_format}{self.RESET}"
-        )
-        if record.levelno >= logging.WARNING:
-            log_fmt += " - (%(filename)s:%(lineno)d)"
-        formatter = logging.Formatter(log_fmt)
+        formatter = self.formatters.get(record.levelno)
+        if formatter is None:
+            log_fmt = (
+                f"{self.FORMATS.get(record.levelno)}"
+                f"{self.prefix_format}{self.RESET}"
+            )
+            if record.levelno >= logging.WARNING:
+                log_fmt += " - (%(filename)s:%(lineno)d)"
+            formatter = logging.Formatter(log_fmt)
+            self.formatters[record.levelno] = formatter
         return formatter.format(record)
 
 
-def activate_logger(
+class RecordQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler for a listener of the same process. Only the message is
+    merged with its arguments in the caller thread, everything else
+    (including the exception info) is left to the handlers of the listener.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def generate_handlers(
     directory: str = None,
-    logger_level: str = "",
-    root_logger_level: str = "CRITICAL",
     stdout=None,
+    asynchronous: bool = False,
+    datefmt: str = "%m/%d/%Y %I:%M:%S %p",
 ):
+    """
+    Returns the handlers to attach. In the asynchronous mode, this is a
+    single queue handler, and the formatting and writing of the records
+    happen in the thread of a queue listener.
+    """
     chosen_stdout = stdout
     if not chosen_stdout:
         chosen_stdout = sys.stdout
@@ -52,15 +78,48 @@ def activate_logger(
         prefix_format = "%(asctime)s - %(levelname)8s: %(message)s"
 
     handlers[0].setFormatter(CustomFormatter(prefix_format=prefix_format))
-    logging.basicConfig(
-        handlers=handlers,
-        format=prefix_format,  # for default
-        datefmt="%m/%d/%Y %I:%M:%S %p",
-        level=getattr(logging, root_logger_level),
+    for handler in handlers[1:]:
+        handler.setFormatter(logging.Formatter(prefix_format, datefmt))
+    if not asynchronous:
+        return handlers
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        records,
+        *handlers,
+        respect_handler_level=True,
     )
+    listener.start()
+    # the remaining records are written at exit
+    atexit.register(listener.stop)
+    queue_handler = RecordQueueHandler(records)
+    queue_handler.listener = listener
+    return [queue_handler]
+
+
+def activate_logger(
+    directory: str = None,
+    logger_level: str = "",
+    root_logger_level: str = "CRITICAL",
+    stdout=None,
+    asynchronous: bool = False,
+):
     logger = logging.getLogger("metahep")
     if logger_level:
         logger.setLevel(logger_level)
+    if logging.getLogger().handlers:
+        # basicConfig would ignore the handlers, so they are not created:
+        # the listener thread and the log file would leak
+        logger.debug("Logging already configured. Keeping its handlers.")
+        return logger
+    handlers = generate_handlers(
+        directory=directory,
+        stdout=stdout,
+        asynchronous=asynchronous,
+    )
+    logging.basicConfig(
+        handlers=handlers,
+        level=getattr(logging, root_logger_level),
+    )
     if directory:
-        logger.debug(f"Activating the logger in '{logger_file}'")
+        logger.debug(f"Activating the logger in '{directory}/output.log'")
     return logger
@@ -0,0 +1,92 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+from core.config import Config
+
+METRICS_FILE = "metrics.jsonl"
+
+_lock = threading.Lock()
+
+
+def log_metrics(stage: str, config=None, **metrics) -> None:
+    """
+    Appends a JSON line with the metrics of the stage
+    to the metrics file in the output area.
+    """
+    config = config or Config()
+    if not config.metrics_log:
+        return
+    record = {
+        "timestamp": datetime.now().isoformat(),
+        "run_number": config.run_number,
+        "action": config._action,
+        "model_name": config._model_name,
+        "stage": stage,
+        **metrics,
+    }
+    line = json.dumps(record, default=str)
+    metrics_path = os.path.join(config.output_area, METRICS_FILE)
+    with _lock:
+        try:
+            with open(metrics_path, "a") as f:
+                f.write(line + "\n")
+        except FileNotFoundError:
+            # e.g. a temporary output area already removed,
+            # the metrics must not stop the run
+            config.log.warning(
+                f"--> Metrics of '{stage}' not written: "
+                f"'{metrics_path}' cannot be created."
+            )
+
+
+@contextmanager
+def timed(stage: str, config=None, **metrics):
+    """
+    Logs the duration of the block in seconds with the given metrics.
+    The yielded dictionary can be filled with more metrics in the block.
+    """
+    start = time.perf_counter()
+    metrics["status"] = "failed"
+    try:
+        yield metrics
+        metrics["status"] = "done"
+    finally:
+        log_metrics(
+            stage,
+            config=config,
+            duration=time.perf_counter() - start,
+            **metrics,
+        )
+
+
+def generate_metrics_logger(batch_size: int = 1):
+    import tensorflow as tf
+
+    class MetricsLogger(tf.keras.callbacks.Callback):
+        """
+        Logs the duration, the throughput and the logs of every epoch.
+        """
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+            self.steps = 0
+
+        def on_train_batch_end(self, batch, logs=None):
+            self.steps = batch + 1
+
+        def on_epoch_end(self, epoch, logs=None):
+            duration = time.perf_counter() - self.epoch_start
+            log_metrics(
+                "epoch",
+                epoch=epoch,
+                duration=duration,
+                steps=self.steps,
+                samples_per_second=self.steps * batch_size / duration,
+                **{key: float(value) for key, value in (logs or {}).items()},
+            )
+
+    return MetricsLogger()
@@ -1,12 +1,20 @@
 import click
-from core.utils import add_options
+from core.utils import add_options, lazy_command
 from core.config import Config
+from core.constants import ACTIVE_MODEL_NAMES
 from importlib import import_module
 
 
-ACTIVE_MODEL_NAMES = [
-    "test",
-]
+def model_commands() -> dict:
+    """
+    Lazy model subcommands of the action groups.
+    """
+    return {
+        model_name: lazy_command(
+            "core.model:model_cli_generator", model_name=model_name
+        )
+        for model_name in ACTIVE_MODEL_NAMES
+    }
 
 
 def model_cli_generator(model_name: str):
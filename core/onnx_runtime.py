@@ -0,0 +1,293 @@
+import os
+import json
+import time
+
+from core.config import Config
+from core.metrics import log_metrics
+
+ONNX_BENCHMARK_FILE = "onnx_benchmark.json"
+
+
+def create_session(model_path: str, threads: int = None, optimization=None):
+    """
+    Returns an onnxruntime session on the CPU. The optimization is a
+    graph optimization level, e.g. 'basic'. All of them by default.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    if threads:
+        options.intra_op_num_threads = threads
+    if optimization:
+        options.graph_optimization_level = getattr(
+            ort.GraphOptimizationLevel, f"ORT_ENABLE_{optimization.upper()}"
+        )
+    return ort.InferenceSession(
+        model_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def optimize_model(model_path: str, output_path: str, optimization: str):
+    """
+    Writes the model as optimized by onnxruntime at the given level.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = getattr(
+        ort.GraphOptimizationLevel, f"ORT_ENABLE_{optimization.upper()}"
+    )
+    options.optimized_model_filepath = output_path
+    ort.InferenceSession(
+        model_path, sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def generate_calibration_reader(model_path: str, inputs, batch_size: int):
+    """
+    Returns an onnxruntime calibration data reader
+    giving the inputs in batches.
+    """
+    from onnxruntime.quantization import CalibrationDataReader
+
+    session = create_session(model_path)
+
+    class CalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            samples_no = len(
+                inputs[0] if isinstance(inputs, tuple) else inputs
+            )
+            self.batches = iter(range(0, samples_no, batch_size))
+
+        def get_next(self):
+            start = next(self.batches, None)
+            if start is None:
+                return None
+            batch = slice(start, start + batch_size)
+            if isinstance(inputs, tuple):
+                return session_feed(
+                    session, tuple(array[batch] for array in inputs)
+                )
+            return session_feed(session, inputs[batch])
+
+    return CalibrationReader()
+
+
+def quantize_model(
+    model_path: str,
+    output_path: str,
+    mode: str,
+    calibration_reader=None,
+):
+    """
+    Writes the model with int8 weights, and with int8 activations too
+    with the 'static' mode, calibrated on the given reader.
+    """
+    from onnxruntime.quantization import (
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if mode == "dynamic":
+        quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    else:
+        quantize_static(
+            model_path,
+            output_path,
+            calibration_reader,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8,
+        )
+
+
+def session_feed(session, inputs) -> dict:
+    """
+    Maps the model inputs, a single array or a tuple of arrays
+    in the order of the model inputs, to the session input names.
+    """
+    import numpy as np
+
+    if not isinstance(inputs, (tuple, list)):
+        inputs = (inputs,)
+    return {
+        spec.name: np.asarray(array)
+        for spec, array in zip(session.get_inputs(), inputs)
+    }
+
+
+def take_inputs(test_dataset, samples_no: int) -> tuple:
+    """
+    Returns the inputs and the targets of the first samples
+    of the unbatched test dataset, stacked into arrays.
+    """
+    import numpy as np
+
+    elements = list(test_dataset.take(samples_no).as_numpy_iterator())
+    if not elements:
+        return None, None
+    inputs, targets = zip(*elements)
+    if isinstance(inputs[0], tuple):
+        inputs = tuple(np.stack(arrays) for arrays in zip(*inputs))
+    else:
+        inputs = np.stack(inputs)
+    return inputs, np.stack(targets)
+
+
+def _repeat_to_batch(inputs, batch_size: int):
+    import numpy as np
+
+    def repeat(array):
+        repeats = -(-batch_size // len(array))
+        return np.concatenate([array] * repeats)[:batch_size]
+
+    if isinstance(inputs, tuple):
+        return tuple(repeat(array) for array in inputs)
+    return repeat(inputs)
+
+
+def benchmark_session(model_path: str, inputs, config=None) -> list:
+    """
+    Times the model on the CPU for every batch size and number of
+    intra-op threads of the config, with the inputs repeated to the
+    batch size. Returns the latencies in ms and the throughputs.
+    """
+    import numpy as np
+
+    config = config or Config()
+    results = []
+    for threads in config.onnx_benchmark_threads:
+        session = create_session(model_path, threads=threads)
+        for batch_size in config.onnx_benchmark_batch_sizes:
+            feed = session_feed(session, _repeat_to_batch(inputs, batch_size))
+            # warm up, e.g. for the memory allocations
+            session.run(None, feed)
+            latencies = []
+            for _ in range(config.onnx_benchmark_repeats):
+                start = time.perf_counter()
+                session.run(None, feed)
+                latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+            result = {
+                "threads": threads,
+                "batch_size": batch_size,
+                "latency_ms": float(np.median(latencies)),
+                "latency_p90_ms": float(np.percentile(latencies, 90)),
+                "samples_per_second": float(
+                    batch_size * 1000 / np.median(latencies)
+                ),
+            }
+            config.log.info(
+                f"--> {threads} thread(s), batch size {batch_size}: "
+                f"{result['latency_ms']:.3f} ms, "
+                f"{result['samples_per_second']:.1f} samples/s."
+            )
+            log_metrics("onnx_benchmark", config=config, **result)
+            results.append(result)
+    return results
+
+
+def benchmark_keras(model, inputs, config=None) -> list:
+    """
+    Times the Keras model for every batch size of the config,
+    as the reference of the onnxruntime benchmark.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    config = config or Config()
+    predict = tf.function(lambda x: model(x, training=False))
+    results = []
+    for batch_size in config.onnx_benchmark_batch_sizes:
+        batch = _repeat_to_batch(inputs, batch_size)
+        predict(batch)
+        latencies = []
+        for _ in range(config.onnx_benchmark_repeats):
+            start = time.perf_counter()
+            tf.nest.map_structure(
+                lambda output: output.numpy(), predict(batch)
+            )
+            latencies.append(time.perf_counter() - start)
+        latency = float(np.median(latencies) * 1000)
+        config.log.info(
+            f"--> Keras, batch size {batch_size}: {latency:.3f} ms, "
+            f"{batch_size * 1000 / latency:.1f} samples/s."
+        )
+        results.append(
+            {
+                "batch_size": batch_size,
+                "latency_ms": latency,
+                "samples_per_second": batch_size * 1000 / latency,
+            }
+        )
+    return results
+
+
+def check_parity(session, keras_model, inputs, config=None) -> dict:
+    """
+    Compares the outputs of the session with the Keras model
+    on the same inputs.
+    """
+    import numpy as np
+
+    config = config or Config()
+    expected = keras_model(inputs, training=False)
+    if not isinstance(expected, (tuple, list)):
+        expected = [expected]
+    outputs = session.run(None, session_feed(session, inputs))
+    max_abs_diff = 0.0
+    max_rel_diff = 0.0
+    for expected_output, output in zip(expected, outputs):
+        expected_output = np.asarray(expected_output, dtype=np.float64)
+        diff = np.abs(expected_output - output)
+        max_abs_diff = max(max_abs_diff, float(diff.max(initial=0)))
+        max_rel_diff = max(
+            max_rel_diff,
+            float(
+                (diff / np.maximum(np.abs(expected_output), 1e-12)).max(
+                    initial=0
+                )
+            ),
+        )
+    return {
+        "samples": len(outputs[0]),
+        "max_abs_diff": max_abs_diff,
+        "max_rel_diff": max_rel_diff,
+        "passed": all(
+            np.allclose(
+                output,
+                expected_output,
+                rtol=config.onnx_parity_tolerance,
+                atol=config.onnx_parity_tolerance,
+            )
+            for expected_output, output in zip(expected, outputs)
+        ),
+    }
+
+
+def compare_sessions(reference, session, inputs, targets) -> dict:
+    """
+    Returns the differences between the first outputs of the session and
+    of the reference session and, if the targets have the shape of the
+    outputs, the change of their mean absolute error on the targets.
+    """
+    import numpy as np
+
+    expected = reference.run(None, session_feed(reference, inputs))[0]
+    outputs = session.run(None, session_feed(session, inputs))[0]
+    diff = np.abs(outputs.astype(np.float64) - expected)
+    comparison = {
+        "max_abs_diff": float(diff.max(initial=0)),
+        "mean_abs_diff": float(diff.mean()),
+    }
+    if targets is not None and np.shape(targets) == outputs.shape:
+        reference_error = float(np.abs(expected - targets).mean())
+        error = float(np.abs(outputs - targets).mean())
+        comparison["target_mean_abs_error"] = error
+        comparison["target_mean_abs_error_delta"] = error - reference_error
+    return comparison
+
+
+def write_onnx_benchmark(config, results: dict) -> None:
+    with open(os.path.join(config.output_area, ONNX_BENCHMARK_FILE), "w") as f:
+        json.dump(results, f, indent=2)
@@ -0,0 +1,302 @@
+import os
+import time
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import click
+
+from core.config import Config
+from core.dataset import update_tfrecord_manifest
+from core.metrics import log_metrics, timed
+from core.model import model_commands
+from core.onnx_runtime import create_session, session_feed
+from core.utils import (
+    LazyGroup,
+    add_options,
+    get_global_batch_size,
+    set_precision_policy,
+)
+
+
+def predict(model, dataset, encoder=None) -> dict:
+    """
+    The model can also be given as a function building it, and is not
+    used by the 'onnx' backend. The dataset gives the inputs, or
+    (inputs, targets) pairs whose targets are ignored.
+
+    The encoder serializes the predictions of a shard, a list of arrays
+    or of tuples of arrays, one per input element, into records. By
+    default, every output is stored as a flat float list.
+
+    The batches are prefetched while the current one is predicted,
+    and the shards are encoded and written by threads meanwhile.
+    """
+    config = Config()
+    config.check_readiness()
+    start_time = datetime.now()
+    config.log.info(
+        f"-> Started predicting with the '{config._model_name}' model."
+    )
+    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    output_dir = config.prediction_output_files
+    if not output_dir or not os.path.isdir(output_dir):
+        msg = (
+            f"Prediction directory '{output_dir}' does not exist. "
+            "Please create it manually."
+        )
+        config.log.error(msg)
+        raise FileNotFoundError(msg)
+    if not config.model_path:
+        msg = "No model weights provided."
+        config.log.error(msg)
+        raise FileNotFoundError(msg)
+    if not config.tfrecord_deterministic:
+        config.log.warning(
+            "--> The records are read out of order, so the predictions "
+            "will not be in the order of the input files."
+        )
+    with timed(
+        "predict",
+        backend=config.prediction_backend,
+        samples=0,
+        shards=0,
+    ) as metrics:
+        start = time.perf_counter()
+        written = _predict(
+            config,
+            _generate_predictor(config, model),
+            _prepare_dataset(config, dataset),
+            encoder or _encode_predictions,
+        )
+        metrics["samples"] = sum(records for _, records, _ in written)
+        metrics["shards"] = len(written)
+        metrics["samples_per_second"] = metrics["samples"] / (
+            time.perf_counter() - start
+        )
+    config.log.info(
+        f"--> {metrics['samples']} sample(s) predicted in "
+        f"{metrics['shards']} shard(s), "
+        f"{metrics['samples_per_second']:.1f} samples/s."
+    )
+    # the other files already there, to be kept in the manifest
+    written_names = {file_name for file_name, *_ in written}
+    update_tfrecord_manifest(
+        config,
+        output_dir,
+        [
+            file_name
+            for file_name in os.listdir(output_dir)
+            if file_name.endswith(".tf") and file_name not in written_names
+        ],
+        written,
+        config.prediction_compression_type,
+        config.prediction_compression_level,
+        None,
+    )
+    config.log.info(
+        f"-> Finished predicting with the '{config._model_name}' model."
+    )
+    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    config.log.info(f"--> Took: {datetime.now() - start_time} h.")
+    return metrics
+
+
+def _prepare_dataset(config, dataset):
+    import tensorflow as tf
+
+    config.log.debug("-> Dataset preparation...")
+    if config.batched_decoding:
+        config.log.debug("--> Dataset already batched by the dataloader.")
+    else:
+        global_batch_size = get_global_batch_size(config)
+        config.log.debug(f"--> Global batch size: {global_batch_size}.")
+        dataset = dataset.batch(global_batch_size)
+    if isinstance(dataset.element_spec, tuple):
+        dataset = dataset.map(
+            lambda x, *_: x, num_parallel_calls=tf.data.AUTOTUNE
+        )
+    # read and decoded while the current batch is predicted
+    dataset = dataset.prefetch(buffer_size=tf.data.AUTOTUNE)
+    config.log.debug("--> Done.")
+    return dataset
+
+
+def _generate_predictor(config, model):
+    """
+    Returns a function mapping a batch of inputs
+    to the list of the output arrays.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    if config.prediction_backend == "onnx":
+        config.log.debug(f"-> Loading the ONNX model: '{config.model_path}'.")
+        session = create_session(
+            config.model_path, threads=config.prediction_threads
+        )
+        config.log.debug("--> Done.")
+
+        def onnx_predictor(inputs):
+            inputs = tf.nest.map_structure(lambda x: x.numpy(), inputs)
+            return session.run(None, session_feed(session, inputs))
+
+        return onnx_predictor
+
+    set_precision_policy(config)
+    if callable(model) and not hasattr(model, "fit"):
+        config.log.debug("-> Building the model.")
+        model = model()
+        config.log.debug("--> Done.")
+    config.log.debug(f"-> Loading weights: '{config.model_path}'.")
+    model.load_weights(config.model_path).expect_partial()
+    config.log.debug("--> Done.")
+
+    def predict_batch(x):
+        return tf.nest.map_structure(
+            lambda output: tf.cast(output, tf.float32),
+            model(x, training=False),
+        )
+
+    predict_batch = tf.function(predict_batch, jit_compile=config.jit_compile)
+
+    def keras_predictor(inputs):
+        outputs = predict_batch(inputs)
+        if not isinstance(outputs, (tuple, list)):
+            outputs = [outputs]
+        return [np.asarray(output) for output in outputs]
+
+    return keras_predictor
+
+
+def _predict(config, predictor, dataset, encoder) -> list:
+    """
+    Predicts the batches into shards of predictions, and submits every
+    full shard to the writers. Returns the (file name, records, bytes)
+    of the written shards, in order.
+    """
+    workers_no = config.prediction_workers
+    config.log.debug(
+        f"-> Predicting with the '{config.prediction_backend}' backend "
+        f"and {workers_no} writer thread(s)."
+    )
+    pending = deque()
+    written = []
+    shard = []
+    with ThreadPoolExecutor(
+        max_workers=workers_no, thread_name_prefix="prediction_writer"
+    ) as executor:
+
+        def submit(shard):
+            file_path = os.path.join(
+                config.prediction_output_files,
+                f"predictions-{len(written) + len(pending):05d}.tf",
+            )
+            pending.append(
+                (
+                    file_path,
+                    executor.submit(
+                        _write_predictions, config, file_path, shard, encoder
+                    ),
+                )
+            )
+            # do not keep more predictions in memory than the writers need
+            while len(pending) > 2 * workers_no:
+                written.append(_wait_for_shard(config, *pending.popleft()))
+
+        for inputs in dataset:
+            outputs = predictor(inputs)
+            for index in range(len(outputs[0])):
+                shard.append(
+                    outputs[0][index]
+                    if len(outputs) == 1
+                    else tuple(output[index] for output in outputs)
+                )
+                if len(shard) == config.prediction_shard_size:
+                    submit(shard)
+                    shard = []
+        if shard:
+            submit(shard)
+        while pending:
+            written.append(_wait_for_shard(config, *pending.popleft()))
+    return written
+
+
+def _write_predictions(config, file_path: str, shard: list, encoder) -> int:
+    import tensorflow as tf
+
+    options = tf.io.TFRecordOptions(
+        compression_type=config.prediction_compression_type,
+        compression_level=config.prediction_compression_level,
+    )
+    records = 0
+    with tf.io.TFRecordWriter(file_path, options=options) as writer:
+        for record in encoder(shard):
+            writer.write(record)
+            records += 1
+    return records
+
+
+def _wait_for_shard(config, file_path: str, future) -> tuple:
+    records = future.result()
+    config.log.debug(f"--> Written {records} prediction(s): '{file_path}'.")
+    log_metrics(
+        "prediction_shard",
+        config=config,
+        file=os.path.basename(file_path),
+        records=records,
+    )
+    return os.path.basename(file_path), records, os.path.getsize(file_path)
+
+
+def _encode_predictions(shard: list):
+    """
+    Yields a tf.train.Example per prediction, with the 'prediction'
+    feature, or 'prediction_<i>' for the i-th of several outputs.
+    """
+    import tensorflow as tf
+
+    for prediction in shard:
+        if isinstance(prediction, tuple):
+            outputs = {
+                f"prediction_{index}": output
+                for index, output in enumerate(prediction)
+            }
+        else:
+            outputs = {"prediction": prediction}
+        example = tf.train.Example(
+            features=tf.train.Features(
+                feature={
+                    name: tf.train.Feature(
+                        float_list=tf.train.FloatList(value=output.ravel())
+                    )
+                    for name, output in outputs.items()
+                }
+            )
+        )
+        yield example.SerializeToString()
+
+
+def predict_cli_generator():
+    @click.group(
+        name="predict",
+        cls=LazyGroup,
+        lazy_commands=model_commands(),
+        context_settings={"show_default": True},
+    )
+    @add_options(mode="prediction")
+    def predict_cli(*_, **kwargs):
+        """
+        Predict on TFRecord files with the model.
+        """
+        config = Config()
+        config.set_action("predict")
+        config.log.debug(
+            "-> Updating the PREDICTION configuration with CLI parameters."
+        )
+        for prop, value in kwargs.items():
+            default = getattr(config, prop)
+            if default != value:
+                setattr(config, prop, value)
+        config.log.debug("--> Done.")
+
+    return predict_cli
@@ -0,0 +1,171 @@
+import os
+import csv
+import json
+import time
+
+from core.config import Config
+
+PROFILE_TIMES = [
+    "batch_time",
+    "host_time",
+    "data_wait_time",
+    "step_time",
+]
+
+
+def generate_throughput_profiler(
+    sampling_interval: int = 10,
+    batch_size: int = 1,
+    output_dir: str = None,
+):
+    import numpy as np
+    import tensorflow as tf
+
+    class ThroughputProfiler(tf.keras.callbacks.Callback):
+        """
+        Times every N-th training batch (one call of the training function):
+        - batch_time: wall time of the batch,
+        - host_time: time between the batch and the previous one,
+        - data_wait_time: time waiting on the iterator,
+        - step_time: time spent in the training steps.
+        The last two are only known if the training loop provides them
+        in the batch logs, as the custom training loop does. The Keras
+        loop runs the data fetching and the steps in the same call, so
+        they are left out of the records and of the report with it.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.sampling_interval = sampling_interval
+            self.batch_size = batch_size
+            self.output_dir = output_dir
+
+        def on_train_begin(self, logs=None):
+            self.records = []
+            self.batches = 0
+            self.steps = 0
+            self.time = 0.0
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch = epoch
+            self.epoch_start = time.perf_counter()
+            self.batch_end = None
+            self.last_batch = -1
+
+        def on_train_batch_begin(self, batch, logs=None):
+            self.sampled = self.batches % self.sampling_interval == 0
+            self.batches += 1
+            if self.sampled:
+                self.batch_begin = time.perf_counter()
+
+        def on_train_batch_end(self, batch, logs=None):
+            now = time.perf_counter()
+            logs = logs or {}
+            # several steps per batch with steps_per_execution
+            steps = batch - self.last_batch
+            self.last_batch = batch
+            self.steps += steps
+            if self.sampled:
+                record = {
+                    "epoch": self.epoch,
+                    "batch": batch,
+                    "steps": steps,
+                    "batch_time": now - self.batch_begin,
+                    "host_time": (
+                        self.batch_begin - self.batch_end
+                        if self.batch_end
+                        else None
+                    ),
+                }
+                for name in ["data_wait_time", "step_time"]:
+                    if name in logs:
+                        record[name] = float(logs[name])
+                record["samples_per_second"] = (
+                    steps * self.batch_size / record["batch_time"]
+                )
+                self.records.append(record)
+            self.batch_end = now
+
+        def on_epoch_end(self, epoch, logs=None):
+            if self.batch_end:
+                self.time += self.batch_end - self.epoch_start
+
+        def on_train_end(self, logs=None):
+            report = self.report()
+            config = Config()
+            config.log.info(
+                "-> Throughput: "
+                f"{report['samples_per_second']:.1f} samples/s, "
+                f"{report['steps_per_second']:.1f} steps/s."
+            )
+            for name in PROFILE_TIMES:
+                if name in report["percentiles"]:
+                    percentiles = report["percentiles"][name]
+                    config.log.info(
+                        f"--> {name}: "
+                        + ", ".join(
+                            f"{key}: {1e3 * value:.3f} ms"
+                            for key, value in percentiles.items()
+                        )
+                    )
+            if self.output_dir:
+                self.dump(report)
+
+        def report(self) -> dict:
+            percentiles = {}
+            for name in PROFILE_TIMES:
+                values = [
+                    record[name]
+                    for record in self.records
+                    if record.get(name) is not None
+                ]
+                if values:
+                    percentiles[name] = {
+                        "mean": float(np.mean(values)),
+                        "p50": float(np.percentile(values, 50)),
+                        "p90": float(np.percentile(values, 90)),
+                        "p99": float(np.percentile(values, 99)),
+                    }
+            return {
+                "steps": self.steps,
+                "batch_size": self.batch_size,
+                "training_time": self.time,
+                "steps_per_second": self.steps / self.time if self.time else 0,
+                "samples_per_second": (
+                    self.steps * self.batch_size / self.time
+                    if self.time
+                    else 0
+                ),
+                "sampling_interval": self.sampling_interval,
+                "sampled_batches": len(self.records),
+                "percentiles": percentiles,
+            }
+
+        def dump(self, report: dict) -> None:
+            config = Config()
+            report_path = os.path.join(self.output_dir, "profile.json")
+            with open(report_path, "w") as report_file:
+                json.dump(report, report_file, indent=2)
+            records_path = os.path.join(self.output_dir, "profile.csv")
+            with open(records_path, "w", newline="") as records_file:
+                writer = csv.DictWriter(
+                    records_file,
+                    fieldnames=[
+                        "epoch",
+                        "batch",
+                        "steps",
+                        *[
+                            name
+                            for name in PROFILE_TIMES
+                            if any(name in record for record in self.records)
+                        ],
+                        "samples_per_second",
+                    ],
+                )
+                writer.writeheader()
+                writer.writerows(self.records)
+            config.log.debug(
+                f"--> Profile dumped to '{report_path}' and '{records_path}'"
+            )
+
+    return ThroughputProfiler()
@@ -1,8 +1,18 @@
 from datetime import datetime
+import time
 import click
 
 from core.config import Config
-from core.utils import add_options
+from core.metrics import timed, generate_metrics_logger
+from core.model import model_commands
+from core.profiler import generate_throughput_profiler
+from core.utils import (
+    LazyGroup,
+    add_options,
+    get_distribution_strategy,
+    get_global_batch_size,
+    set_precision_policy,
+)
 
 
 def train(
@@ -12,36 +22,73 @@ def train(
     val_dataset,
     custom_callbacks=[],
 ):
-    import tensorflow as tf
-
+    """
+    The model can also be given as a function building it,
+    so that it is built in the scope of the distribution strategy.
+    """
     config = Config()
     config.check_readiness()
     start_time = datetime.now()
     config.log.info(f"-> Started training the '{config._model_name}' model.")
     config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    strategy = get_distribution_strategy()
+    with strategy.scope(), timed("train"):
+        _train(model, loss, dataset, val_dataset, custom_callbacks)
+    config.log.info(f"-> Finished training the '{config._model_name}' model.")
+    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
+    config.log.info(f"--> Took: {datetime.now() - start_time} h.")
+
+
+def _train(model, loss, dataset, val_dataset, custom_callbacks):
+    import tensorflow as tf
+
+    config = Config()
+    set_precision_policy(config)
+    if callable(model) and not hasattr(model, "fit"):
+        config.log.debug("-> Building the model.")
+        model = model()
+        config.log.debug("--> Done.")
     config.log.debug("-> Model summary: ")
     model.summary(print_fn=lambda x: config.log.debug(x))
     config.log.debug("-> Adding the optimizer.")
     optimizer = tf.keras.optimizers.Adam(lr=config.learning_rate)
+    if config.precision_policy == "mixed_float16":
+        config.log.debug("--> Adding the loss scaling.")
+        optimizer = tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
     config.log.debug("--> Done.")
     if config.model_path:
         config.log.debug("-> Loading weights: ")
         model.load_weights(config.model_path).expect_partial()
         config.log.debug("--> Done.")
     config.log.debug("-> Compiling model...")
-    model.compile(optimizer=optimizer, loss=loss())
+    loss_fn = loss()
+    model.compile(
+        optimizer=optimizer,
+        loss=loss_fn,
+        jit_compile=config.jit_compile,
+        steps_per_execution=config.steps_per_execution,
+    )
     # FIXME: why this needed?
     tf.keras.backend.set_value(model.optimizer.lr, config.learning_rate)
     config.log.debug("--> Done.")
     config.log.debug("-> Dataset preparation...")
-    dataset = dataset.batch(config.batch_size)
+    if config.batched_decoding:
+        config.log.debug("--> Datasets already batched by the dataloader.")
+    else:
+        global_batch_size = get_global_batch_size(config)
+        config.log.debug(f"--> Global batch size: {global_batch_size}.")
+        dataset = dataset.batch(global_batch_size)
+        val_dataset = val_dataset.batch(global_batch_size)
     dataset = dataset.prefetch(
         buffer_size=tf.data.experimental.AUTOTUNE,
     )
-    val_dataset = val_dataset.batch(config.batch_size)
     val_dataset = val_dataset.prefetch(
         buffer_size=tf.data.experimental.AUTOTUNE,
     )
+    if config.training_loop == "keras" and config.steps_per_execution > 1:
+        # keras needs the number of steps to run several steps per execution
+        dataset = _ensure_cardinality(dataset)
+        val_dataset = _ensure_cardinality(val_dataset)
     config.log.debug("--> Done.")
     config.log.debug("-> Adding callbacks...")
     callbacks = []
@@ -93,21 +140,263 @@ def train(
     if custom_callbacks:
         config.log.debug("--> Adding custom callbacks")
         callbacks.extend(custom_callbacks)
+    if config.throughput_profiler:
+        config.log.debug("--> Adding ThroughputProfiler callback")
+        callbacks.append(
+            generate_throughput_profiler(
+                sampling_interval=config.throughput_profiler_sampling_interval,
+                batch_size=get_global_batch_size(config),
+                output_dir=config.output_area,
+            )
+        )
+    if config.metrics_log:
+        callbacks.append(
+            generate_metrics_logger(batch_size=get_global_batch_size(config))
+        )
+    step_timer = _generate_step_timer()
+    callbacks.append(step_timer)
     config.log.debug("-> Training...")
-    model.fit(
-        dataset,
+    if config.training_loop == "custom":
+        _custom_fit(model, loss_fn, dataset, val_dataset, callbacks)
+    else:
+        model.fit(
+            dataset,
+            epochs=config.epochs,
+            validation_data=val_dataset,
+            callbacks=callbacks,
+        )
+    if step_timer.steps:
+        time_per_step = 1e3 * step_timer.time / step_timer.steps
+        config.log.info(
+            f"--> Time per step: {time_per_step:.3f} ms"
+            f" over {step_timer.steps} steps"
+            f" ({config.steps_per_execution} step(s) per execution)."
+        )
+
+
+def _ensure_cardinality(dataset):
+    """
+    The extra pass reads and decodes the whole dataset once more before
+    the training. The TFRecord dataloader avoids it when the files have
+    a manifest, which gives the number of records.
+    """
+    import tensorflow as tf
+
+    if dataset.cardinality() >= 0:
+        return dataset
+    config = Config()
+    config.log.warning(
+        "Unknown dataset size. Counting the batches with an extra pass."
+    )
+    batches_no = dataset.reduce(
+        tf.constant(0, tf.int64), lambda count, _: count + 1
+    )
+    return dataset.apply(tf.data.experimental.assert_cardinality(batches_no))
+
+
+def _generate_step_timer():
+    import tensorflow as tf
+
+    class StepTimer(tf.keras.callbacks.Callback):
+        """
+        Measures the time spent in the training steps,
+        leaving out the validation.
+        """
+
+        def __init__(self):
+            super().__init__()
+            self.steps = 0
+            self.time = 0.0
+
+        def on_epoch_begin(self, epoch, logs=None):
+            self.epoch_start = time.perf_counter()
+            self.epoch_steps = 0
+            self.epoch_time = 0.0
+
+        def on_train_batch_end(self, batch, logs=None):
+            self.epoch_steps = batch + 1
+            self.epoch_time = time.perf_counter() - self.epoch_start
+
+        def on_epoch_end(self, epoch, logs=None):
+            self.steps += self.epoch_steps
+            self.time += self.epoch_time
+
+    return StepTimer()
+
+
+def _custom_fit(model, loss_fn, dataset, val_dataset, callbacks):
+    """
+    Training loop running 'steps_per_execution' steps per call of a single
+    tf.function, with the dataset iterator inside the graph.
+    The batch logs also give the time waiting on the iterator
+    and the time spent in the steps.
+
+    The wait is the time the steps are blocked on the prefetch buffer,
+    not the time spent in the input pipeline, which runs in the
+    background meanwhile. It stays close to zero as long as the
+    pipeline keeps up with the steps.
+    """
+    import tensorflow as tf
+
+    config = Config()
+    strategy = tf.distribute.get_strategy()
+    optimizer = model.optimizer
+    loss_scaling = isinstance(
+        optimizer, tf.keras.mixed_precision.LossScaleOptimizer
+    )
+
+    # the losses cannot be reduced over the batch in the replicas,
+    # they are averaged over the global batch instead
+    per_example_loss_fn = loss_fn
+    if isinstance(loss_fn, tf.keras.losses.Loss):
+        per_example_loss_fn = loss_fn.from_config(
+            {
+                **loss_fn.get_config(),
+                "reduction": tf.keras.losses.Reduction.NONE,
+            }
+        )
+
+    def compute_loss(x, y, training):
+        """
+        Returns the share of the loss of this replica, summed over the
+        replicas into the loss of the global batch.
+        """
+        y_pred = tf.cast(model(x, training=training), tf.float32)
+        per_example_loss = per_example_loss_fn(tf.cast(y, tf.float32), y_pred)
+        if per_example_loss.shape.rank == 0:
+            # a loss function already reducing the batch, as in Model.fit
+            loss_value = per_example_loss / strategy.num_replicas_in_sync
+        else:
+            if per_example_loss.shape.rank != 1:
+                # e.g. one loss per pixel
+                per_example_loss = tf.reduce_mean(
+                    tf.reshape(per_example_loss, [tf.shape(y)[0], -1]),
+                    axis=1,
+                )
+            # the size of the global batch from the size of this replica's
+            # batch, so that a partial last batch is not underweighted
+            loss_value = tf.nn.compute_average_loss(per_example_loss)
+        if model.losses:
+            loss_value += tf.nn.scale_regularization_loss(
+                tf.add_n(model.losses)
+            )
+        return loss_value
+
+    def train_step(x, y):
+        with tf.GradientTape() as tape:
+            loss_value = compute_loss(x, y, training=True)
+            scaled_loss = loss_value
+            if loss_scaling:
+                scaled_loss = optimizer.get_scaled_loss(loss_value)
+        variables = model.trainable_variables
+        if variables:
+            gradients = tape.gradient(scaled_loss, variables)
+            if loss_scaling:
+                gradients = optimizer.get_unscaled_gradients(gradients)
+            optimizer.apply_gradients(zip(gradients, variables))
+        return loss_value
+
+    def test_step(x, y):
+        return compute_loss(x, y, training=False)
+
+    if config.jit_compile:
+        train_step = tf.function(train_step, jit_compile=True)
+        test_step = tf.function(test_step, jit_compile=True)
+
+    def generate_multistep_function(step):
+        @tf.function
+        def multistep_function(iterator):
+            loss_sum = tf.constant(0.0)
+            steps = tf.constant(0)
+            # time waiting on the iterator and time spent in the steps
+            data_wait_time = tf.constant(0.0, tf.float64)
+            step_time = tf.constant(0.0, tf.float64)
+            for _ in tf.range(config.steps_per_execution):
+                start = tf.timestamp()
+                optional = iterator.get_next_as_optional()
+                fetched = tf.timestamp()
+                if not optional.has_value():
+                    break
+                x, y = optional.get_value()
+                loss_value = strategy.run(step, args=(x, y))
+                loss_sum += strategy.reduce(
+                    tf.distribute.ReduceOp.SUM, loss_value, axis=None
+                )
+                steps += 1
+                with tf.control_dependencies([loss_sum]):
+                    step_time += tf.timestamp() - fetched
+                data_wait_time += fetched - start
+            return loss_sum, steps, data_wait_time, step_time
+
+        return multistep_function
+
+    train_function = generate_multistep_function(train_step)
+    test_function = generate_multistep_function(test_step)
+    dataset = strategy.experimental_distribute_dataset(dataset)
+    val_dataset = strategy.experimental_distribute_dataset(val_dataset)
+
+    def run_epoch(function, data, on_batch_begin=None, on_batch_end=None):
+        iterator = iter(data)
+        loss_sum = 0.0
+        steps = 0
+        while True:
+            if on_batch_begin:
+                on_batch_begin(steps)
+            (
+                batch_loss_sum,
+                batch_steps,
+                data_wait_time,
+                step_time,
+            ) = function(iterator)
+            batch_steps = int(batch_steps)
+            if not batch_steps:
+                break
+            loss_sum += float(batch_loss_sum)
+            steps += batch_steps
+            if on_batch_end:
+                on_batch_end(
+                    steps - 1,
+                    {
+                        "loss": loss_sum / steps,
+                        "data_wait_time": float(data_wait_time),
+                        "step_time": float(step_time),
+                    },
+                )
+        return {"loss": loss_sum / steps} if steps else {}
+
+    callbacks = tf.keras.callbacks.CallbackList(
+        callbacks,
+        add_history=True,
+        add_progbar=True,
+        model=model,
+        verbose=1,
         epochs=config.epochs,
-        validation_data=val_dataset,
-        callbacks=callbacks,
     )
-    config.log.info(f"-> Finished training the '{config._model_name}' model.")
-    config.log.info(f"--> Time: {start_time.strftime('%H:%M:%S')}.")
-    config.log.info(f"--> Took: {datetime.now() - start_time} h.")
+    model.stop_training = False
+    logs = {}
+    callbacks.on_train_begin()
+    for epoch in range(config.epochs):
+        model.reset_metrics()
+        callbacks.on_epoch_begin(epoch)
+        logs = run_epoch(
+            train_function,
+            dataset,
+            callbacks.on_train_batch_begin,
+            callbacks.on_train_batch_end,
+        )
+        val_logs = run_epoch(test_function, val_dataset)
+        logs.update({f"val_{key}": value for key, value in val_logs.items()})
+        callbacks.on_epoch_end(epoch, logs)
+        if model.stop_training:
+            break
+    callbacks.on_train_end(logs)
 
 
 def train_cli_generator():
     @click.group(
         name="train",
+        cls=LazyGroup,
+        lazy_commands=model_commands(),
         context_settings={"show_default": True},
     )
     @add_options(mode="training")
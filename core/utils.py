@@ -1,4 +1,6 @@
 import click
+import os
+import json
 from core.config import Config
 from importlib import import_module
 
@@ -8,6 +10,38 @@ def set_default_options(verbosity: str, output_area: str, **kwargs):
     config.configure(verbosity=verbosity, output_area=output_area, **kwargs)
 
 
+def lazy_command(import_path: str, **kwargs):
+    """
+    Returns a function importing and calling
+    the 'module:function' command generator.
+    """
+
+    def generate_command():
+        module_name, function_name = import_path.split(":")
+        return getattr(import_module(module_name), function_name)(**kwargs)
+
+    return generate_command
+
+
+class LazyGroup(click.Group):
+    """
+    Group generating its subcommands only when they are needed,
+    so that the CLI starts without importing all of them.
+    """
+
+    def __init__(self, *args, lazy_commands: dict = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            self.add_command(self.lazy_commands[cmd_name](), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
 def add_options(mode: str, model_name: str = None):
     def wrapper(callback):
         if not mode:
@@ -26,3 +60,76 @@ def add_options(mode: str, model_name: str = None):
         return callback
 
     return wrapper
+
+
+def get_worker_info(config) -> tuple:
+    """
+    Returns the (index, count) of this worker,
+    from the config or from the TF_CONFIG environment variable.
+    """
+    index = config.data_worker_index
+    count = config.data_workers_no
+    tf_config = json.loads(os.environ.get("TF_CONFIG") or "{}")
+    if tf_config:
+        cluster = tf_config.get("cluster", {})
+        chiefs_no = len(cluster.get("chief", []))
+        task = tf_config.get("task", {})
+        if count is None:
+            count = chiefs_no + len(cluster.get("worker", []))
+        if index is None:
+            index = task.get("index", 0)
+            if task.get("type") == "worker":
+                index += chiefs_no
+    if not count:
+        count = 1
+    if index is None:
+        index = 0
+    if index >= count:
+        msg = f"Invalid worker index {index} for {count} worker(s)."
+        config.log.error(msg)
+        raise ValueError(msg)
+    return index, count
+
+
+_distribution_strategy = None
+
+
+def get_distribution_strategy(config=None):
+    """
+    Returns the distribution strategy chosen in the config.
+    It is created only once, and for the multi-worker strategy
+    this must happen before any other TensorFlow operation.
+    """
+    import tensorflow as tf
+
+    global _distribution_strategy
+    if _distribution_strategy is None:
+        config = config or Config()
+        if config.distribution_strategy == "mirrored":
+            _distribution_strategy = tf.distribute.MirroredStrategy()
+        elif config.distribution_strategy == "multi_worker_mirrored":
+            _distribution_strategy = (
+                tf.distribute.MultiWorkerMirroredStrategy()
+            )
+        else:
+            _distribution_strategy = tf.distribute.get_strategy()
+        config.log.debug(
+            f"-> Distribution strategy: '{config.distribution_strategy}' "
+            f"with {_distribution_strategy.num_replicas_in_sync} replica(s)."
+        )
+    return _distribution_strategy
+
+
+def get_global_batch_size(config) -> int:
+    strategy = get_distribution_strategy(config)
+    return config.batch_size * strategy.num_replicas_in_sync
+
+
+def set_precision_policy(config) -> None:
+    """
+    Must be called before the model is built.
+    """
+    import tensorflow as tf
+
+    config.log.debug(f"-> Precision policy: '{config.precision_policy}'.")
+    tf.keras.mixed_precision.set_global_policy(config.precision_policy)
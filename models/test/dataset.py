@@ -3,53 +3,134 @@ import string
 import random
 
 
-def generate_tfrecord_decoder():
+def generate_tfrecord_decoder(config=None):
     import tensorflow as tf
 
-    config = Config()
+    config = config or Config()
+
+    if config.encoding == "raw":
+        features = {
+            "x": tf.io.FixedLenFeature([], dtype=tf.string),
+            "y": tf.io.FixedLenFeature([], dtype=tf.string),
+        }
+    else:
+        features = {
+            "x": tf.io.FixedLenSequenceFeature(
+                [], dtype=tf.float32, allow_missing=True
+            ),
+            "y": tf.io.FixedLenSequenceFeature(
+                [], dtype=tf.float32, allow_missing=True
+            ),
+        }
+
+    def decode(feature):
+        if config.encoding == "raw":
+            return tf.io.decode_raw(feature, tf.float32)
+        return feature
 
     def decoder(dataset):
-        parsed = tf.io.parse_single_example(
-            dataset,
-            {
-                "x": tf.io.FixedLenSequenceFeature(
-                    [], dtype=tf.float32, allow_missing=True
-                ),
-                "y": tf.io.FixedLenSequenceFeature(
-                    [], dtype=tf.float32, allow_missing=True
-                ),
-            },
-        )
+        parsed = tf.io.parse_single_example(dataset, features)
         shape = [-1] + list(config.input_shape)
         return (
-            tf.reshape(parsed["x"], shape),
-            tf.reshape(parsed["y"], shape),
+            tf.reshape(decode(parsed["x"]), shape),
+            tf.reshape(decode(parsed["y"]), shape),
+        )
+
+    def batched_decoder(dataset):
+        parsed = tf.io.parse_example(dataset, features)
+        shape = [tf.shape(dataset)[0], -1] + list(config.input_shape)
+        return (
+            tf.reshape(decode(parsed["x"]), shape),
+            tf.reshape(decode(parsed["y"]), shape),
         )
 
+    if config.batched_decoding:
+        return batched_decoder
+
     return decoder
 
 
-def generate_tfrecord_encoder(files_no: int, samples_no: int):
+def generate_tfrecord_encoder(files_no: int, samples_no: int, config=None):
+    """
+    The examples of a file are yielded lazily and already serialized,
+    so that only one example at a time is held in memory.
+    The 'raw' encoding stores little-endian float32 buffers.
+    """
+    import numpy as np
     import tensorflow as tf
 
-    config = Config()
+    config = config or Config()
+    samples_no_per_example = (
+        config.generator_samples_no_per_example or samples_no
+    )
+    if samples_no % samples_no_per_example:
+        msg = (
+            f"The number of samples per example ({samples_no_per_example}) "
+            f"does not divide the number of samples per file ({samples_no})."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+
+    def feature(array):
+        if config.encoding == "raw":
+            return tf.train.Feature(
+                bytes_list=tf.train.BytesList(value=[array.tobytes()])
+            )
+        return tf.train.Feature(
+            float_list=tf.train.FloatList(value=array.ravel())
+        )
+
+    def examples():
+        shape = [samples_no_per_example] + list(config.input_shape)
+        for _ in range(samples_no // samples_no_per_example):
+            x = np.ones(shape, dtype="<f4")
+            y = np.ones(shape, dtype="<f4")
+            example = tf.train.Example(
+                features=tf.train.Features(
+                    feature={"x": feature(x), "y": feature(y)}
+                )
+            )
+            yield example.SerializeToString()
 
     def encoder():
         counter = 0
         while counter < files_no:
-            shape = [samples_no] + list(config.input_shape)
-            x = tf.reshape(tf.ones(shape), -1)
-            y = tf.reshape(tf.ones(shape), -1)
-            feature = {
-                "x": tf.train.Feature(float_list=tf.train.FloatList(value=x)),
-                "y": tf.train.Feature(float_list=tf.train.FloatList(value=y)),
-            }
-            example = tf.train.Example(
-                features=tf.train.Features(feature=feature)
-            )
             file_name = "".join(random.choices(string.ascii_lowercase, k=5))
             file_name += ".tf"
-            yield file_name, [example]
+            yield file_name, examples()
             counter += 1
 
     return encoder
+
+
+def generate_npy_encoder(files_no: int, samples_no: int, config=None):
+    """
+    Yields the same elements as the TFRecord encoder,
+    stacked into one (x, y) pair of arrays per shard.
+    """
+    import numpy as np
+
+    config = config or Config()
+    samples_no_per_example = (
+        config.generator_samples_no_per_example or samples_no
+    )
+    if samples_no % samples_no_per_example:
+        msg = (
+            f"The number of samples per example ({samples_no_per_example}) "
+            f"does not divide the number of samples per file ({samples_no})."
+        )
+        config.log.error(msg)
+        raise ValueError(msg)
+
+    def encoder():
+        shape = [
+            samples_no // samples_no_per_example,
+            samples_no_per_example,
+        ] + list(config.input_shape)
+        for _ in range(files_no):
+            shard = "".join(random.choices(string.ascii_lowercase, k=5))
+            x = np.ones(shape, dtype=np.float32)
+            y = np.ones(shape, dtype=np.float32)
+            yield shard, (x, y)
+
+    return encoder
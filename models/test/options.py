@@ -7,6 +7,20 @@ OPTIONS = {
         "type": int,
         "multiple": True,
     },
+    "encoding": {
+        "default": "float_list",
+        "help": "Encoding of the arrays in the TFRecord files. 'raw' stores "
+        "them as the bytes of a contiguous buffer, decoded with decode_raw.",
+        "type": click.Choice(["float_list", "raw"]),
+    },
+    "generator_samples_no_per_example": {
+        "default": 1,
+        "help": "Number of samples per TFRecord example, which must divide "
+        "the number of samples per file. By default, every sample is "
+        "an example of its own, and the dataloader batches them. "
+        "To be used with the data generator.",
+        "type": click.IntRange(min=1),
+    },
     "generator_training_files_no": {
         "default": None,
         "help": "Number of training files to generate. "
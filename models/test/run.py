@@ -1,13 +1,21 @@
 from core.train import train
 from core.generate import generate
+from core.evaluate import evaluate
+from core.convert import convert
+from core.predict import predict
 from core.dataset import (
+    generate_npy_converter,
+    generate_npy_datagenerator,
+    generate_npy_dataloader,
     generate_tfrecord_datagenerator,
     generate_tfrecord_dataloader,
 )
 from core.config import Config
+from core.utils import get_distribution_strategy
 from models.test.model import generate_model
 from models.test.loss import generate_loss
 from models.test.dataset import (
+    generate_npy_encoder,
     generate_tfrecord_encoder,
     generate_tfrecord_decoder,
 )
@@ -21,7 +29,8 @@ def run() -> bool:
         f"-> Starting the run for the '{config._model_name}' model."
     )
     if config._action == "train":
-        model = generate_model()
+        # must be created before any other TensorFlow operation
+        get_distribution_strategy()
         dataset = None
         val_dataset = None
         if config.dataloader_type == "tfrecord":
@@ -33,25 +42,31 @@ def run() -> bool:
                 generate_tfrecord_decoder(),
                 "validation",
             )()
+        elif config.dataloader_type == "npy":
+            dataset = generate_npy_dataloader("training")()
+            val_dataset = generate_npy_dataloader("validation")()
         else:
             raise NotImplementedError(
                 f"Dataloader type '{config.dataloader_type}' not implemented."
             )
-        train(model, generate_loss, dataset, val_dataset)
+        train(generate_model, generate_loss, dataset, val_dataset)
     elif config._action == "generate":
 
         def data_generator():
             for datatype in ["training", "validation", "test"]:
                 config.log.info(f"-> Generating '{datatype}' data.")
-                if getattr(config, f"generator_{datatype}_files_no"):
+                files_no = getattr(config, f"generator_{datatype}_files_no")
+                samples_no = getattr(
+                    config, f"generator_{datatype}_samples_no_per_file"
+                )
+                if config.dataloader_type == "npy" and getattr(
+                    config, f"tfrecord_{datatype}_files"
+                ):
+                    generate_npy_converter(
+                        generate_tfrecord_decoder(), datatype
+                    )()
+                elif files_no:
                     if config.dataloader_type == "tfrecord":
-                        samples_no = getattr(
-                            config,
-                            f"generator_{datatype}_samples_no_per_file",
-                        )
-                        files_no = getattr(
-                            config, f"generator_{datatype}_files_no"
-                        )
                         generate_tfrecord_datagenerator(
                             generate_tfrecord_encoder(
                                 files_no=files_no,
@@ -59,6 +74,14 @@ def run() -> bool:
                             ),
                             datatype,
                         )()
+                    elif config.dataloader_type == "npy":
+                        generate_npy_datagenerator(
+                            generate_npy_encoder(
+                                files_no=files_no,
+                                samples_no=samples_no,
+                            ),
+                            datatype,
+                        )()
                     else:
                         raise NotImplementedError(
                             f"Dataloader type '{config.dataloader_type}'"
@@ -69,7 +92,45 @@ def run() -> bool:
                         f"No '{datatype}' data will be generated. "
                     )
 
-        generate(data_generator)
+        generate(data_generator, generate_tfrecord_decoder())
+    elif config._action == "evaluate":
+        if config.dataloader_type == "tfrecord":
+            test_dataset = generate_tfrecord_dataloader(
+                generate_tfrecord_decoder(),
+                "test",
+            )()
+        elif config.dataloader_type == "npy":
+            test_dataset = generate_npy_dataloader("test")()
+        else:
+            raise NotImplementedError(
+                f"Dataloader type '{config.dataloader_type}' not implemented."
+            )
+        evaluate(generate_model, generate_loss, test_dataset)
+    elif config._action == "convert":
+        test_dataset = None
+        if config.dataloader_type == "tfrecord" and config.tfrecord_test_files:
+            test_dataset = generate_tfrecord_dataloader(
+                generate_tfrecord_decoder(),
+                "test",
+            )()
+        elif config.dataloader_type == "npy" and config.npy_test_files:
+            test_dataset = generate_npy_dataloader("test")()
+        calibration_dataset = None
+        if config.onnx_quantization == "static":
+            if config.dataloader_type == "tfrecord":
+                calibration_dataset = generate_tfrecord_dataloader(
+                    generate_tfrecord_decoder(),
+                    "training",
+                )()
+            elif config.dataloader_type == "npy":
+                calibration_dataset = generate_npy_dataloader("training")()
+        convert(generate_model, test_dataset, calibration_dataset)
+    elif config._action == "predict":
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(),
+            "prediction",
+        )()
+        predict(generate_model, dataset)
     else:
         raise NotImplementedError(
             f"Action '{config._action}' not implemented."
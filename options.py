@@ -2,6 +2,20 @@ import click
 import os
 from core.constants import PROJECT_NAME
 
+
+class IntOrAutotune(click.ParamType):
+    """
+    Positive integer or 'AUTOTUNE' to let tf.data tune the value.
+    """
+
+    name = "integer|AUTOTUNE"
+
+    def convert(self, value, param, ctx):
+        if isinstance(value, str) and value.upper() == "AUTOTUNE":
+            return "AUTOTUNE"
+        return click.IntRange(min=1).convert(value, param, ctx)
+
+
 GENERAL_OPTIONS = {
     "experiment_name": {
         "default": PROJECT_NAME,
@@ -20,6 +34,17 @@ GENERAL_OPTIONS = {
         "help": "Preload the configuration file",
         "type": click.Path(exists=True),
     },
+    "metrics_log": {
+        "default": True,
+        "help": "Write the durations and throughputs of the stages "
+        "as JSON lines to metrics.jsonl in the output area.",
+        "type": bool,
+    },
+    "async_logging": {
+        "default": False,
+        "help": "Format and write the logs in a background thread.",
+        "type": bool,
+    },
 }
 
 TRAINING_OPTIONS = {
@@ -46,6 +71,53 @@ TRAINING_OPTIONS = {
         "help": "Path to the model weights.",
         "type": click.Path(),
     },
+    "distribution_strategy": {
+        "default": "none",
+        "help": "Distribution strategy. The batch size is per replica. "
+        "The multi-worker strategy reads the cluster from TF_CONFIG.",
+        "type": click.Choice(
+            [
+                "none",
+                "mirrored",
+                "multi_worker_mirrored",
+            ]
+        ),
+    },
+    "precision_policy": {
+        "default": "float32",
+        "help": "Keras precision policy. "
+        "The mixed policies compute in 16 bits "
+        "and keep the variables in 32 bits.",
+        "type": click.Choice(
+            [
+                "float32",
+                "mixed_float16",
+                "mixed_bfloat16",
+            ]
+        ),
+    },
+    "jit_compile": {
+        "default": False,
+        "help": "Compile the model with XLA.",
+        "type": bool,
+    },
+    "steps_per_execution": {
+        "default": 1,
+        "help": "Number of training steps run in a single call "
+        "of the compiled training function.",
+        "type": click.IntRange(min=1),
+    },
+    "training_loop": {
+        "default": "keras",
+        "help": "Training loop. The 'custom' loop runs the steps "
+        "with the dataset iterator inside a single tf.function.",
+        "type": click.Choice(
+            [
+                "keras",
+                "custom",
+            ]
+        ),
+    },
 }
 
 TRAINING_STANDARD_CALLBACKS_OPTIONS = {
@@ -119,6 +191,18 @@ TRAINING_STANDARD_CALLBACKS_OPTIONS = {
         "help": "Model checkpoint save best only",
         "type": bool,
     },
+    "throughput_profiler": {
+        "default": False,
+        "help": "Throughput profiler, writing a report of the batch times "
+        "and samples per second to the output area",
+        "type": bool,
+    },
+    "throughput_profiler_sampling_interval": {
+        "default": 10,
+        "help": "Throughput profiler sampling interval, "
+        "only every N-th training batch is timed",
+        "type": click.IntRange(min=1),
+    },
 }
 
 TRAINING_TENSORBOARD_OPTIONS = {
@@ -181,6 +265,7 @@ DATA_OPTIONS = {
         "type": click.Choice(
             [
                 "tfrecord",
+                "npy",
                 "custom",
             ]
         ),
@@ -203,6 +288,31 @@ DATA_OPTIONS = {
         "To be used with the TFRecord dataloader.",
         "type": click.Path(exists=True),
     },
+    "npy_training_files": {
+        "default": None,
+        "help": "Directory of the npy training shards. "
+        "To be used with the npy dataloader.",
+        "type": click.Path(exists=True),
+    },
+    "npy_validation_files": {
+        "default": None,
+        "help": "Directory of the npy validation shards. "
+        "To be used with the npy dataloader.",
+        "type": click.Path(exists=True),
+    },
+    "npy_test_files": {
+        "default": None,
+        "help": "Directory of the npy testing shards. "
+        "To be used with the npy dataloader.",
+        "type": click.Path(exists=True),
+    },
+    "npy_chunk_size": {
+        "default": 256,
+        "help": "Number of elements sliced at once from the memory "
+        "mapped shards. "
+        "To be used with the npy dataloader.",
+        "type": click.IntRange(min=1),
+    },
     "tfrecord_buffer_size": {
         "default": None,
         "help": "TFRecord buffer size. "
@@ -212,9 +322,40 @@ DATA_OPTIONS = {
     "tfrecord_num_parallel_reads": {
         "default": os.cpu_count(),
         "help": "TFRecord number of parallel reads. "
+        "Ignored if the files are interleaved. "
+        "To be used with the TFRecord dataloader.",
+        "type": IntOrAutotune(),
+    },
+    "tfrecord_num_parallel_calls": {
+        "default": "AUTOTUNE",
+        "help": "Number of records decoded in parallel. "
+        "Also used for the parallel interleave of the files, "
+        "up to the cycle length. "
+        "To be used with the TFRecord dataloader.",
+        "type": IntOrAutotune(),
+    },
+    "tfrecord_interleave_cycle_length": {
+        "default": None,
+        "help": "Number of TFRecord files interleaved concurrently. "
+        "If not provided, the files are not interleaved. "
+        "To be used with the TFRecord dataloader.",
+        "type": IntOrAutotune(),
+    },
+    "tfrecord_interleave_block_length": {
+        "default": 1,
+        "help": "Number of consecutive records taken from each "
+        "interleaved TFRecord file. "
         "To be used with the TFRecord dataloader.",
         "type": click.IntRange(min=1),
     },
+    "tfrecord_deterministic": {
+        "default": True,
+        "help": "Keep the order of the records deterministic. "
+        "Disabling it lets the parallel reads and decoding "
+        "run out of order for a better throughput. "
+        "To be used with the TFRecord dataloader.",
+        "type": bool,
+    },
     "tfrecord_compression_type": {
         "default": "GZIP",
         "help": "TFRecord compression type. "
@@ -233,6 +374,144 @@ DATA_OPTIONS = {
         "To be used with the TFRecord dataloader.",
         "type": click.IntRange(min=1, max=9),
     },
+    "batched_decoding": {
+        "default": False,
+        "help": "Batch the serialized records before decoding them, "
+        "so that the decoder is applied to whole batches at once. "
+        "The datasets are then already batched by the dataloader. "
+        "To be used with the TFRecord dataloader.",
+        "type": bool,
+    },
+    "dataset_cache": {
+        "default": "none",
+        "help": "Cache the decoded records, or the serialized TFRecord "
+        "records with the batched decoding: 'none', 'memory' "
+        "or a directory for an on-disk cache. The on-disk cache "
+        "is keyed by the files, their modification times and the "
+        "input shape, so that a stale cache is never reused. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": str,
+    },
+    "shuffle": {
+        "default": False,
+        "help": "Shuffle the order of the training files every epoch "
+        "and the training records within a shuffle buffer. "
+        "The validation, test and prediction data are never shuffled. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": bool,
+    },
+    "shuffle_buffer_size": {
+        "default": None,
+        "help": "Number of elements in the record shuffle buffer. "
+        "If not provided, it is derived from the shuffle buffer memory. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": click.IntRange(min=1),
+    },
+    "shuffle_buffer_memory": {
+        "default": 256,
+        "help": "Memory budget of the record shuffle buffer in MB. "
+        "Used to size the buffer if its size is not provided. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": click.IntRange(min=1),
+    },
+    "shuffle_seed": {
+        "default": None,
+        "help": "Seed of the file and record shuffling. "
+        "If not provided, the runs are not reproducible. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": int,
+    },
+    "data_worker_index": {
+        "default": None,
+        "help": "Index of this worker when sharding the data between "
+        "several processes. If not provided, it is taken from "
+        "TF_CONFIG. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": click.IntRange(min=0),
+    },
+    "data_workers_no": {
+        "default": None,
+        "help": "Number of workers sharing the data. "
+        "If not provided, it is taken from TF_CONFIG. "
+        "To be used with the TFRecord or npy dataloader.",
+        "type": click.IntRange(min=1),
+    },
+    "generator_workers": {
+        "default": 1,
+        "help": "Number of workers writing the TFRecord files in parallel. "
+        "Files are assigned to the workers in a round-robin fashion. "
+        "To be used with the data generator.",
+        "type": click.IntRange(min=1),
+    },
+    "compression_benchmark": {
+        "default": False,
+        "help": "After the generation, benchmark every TFRecord "
+        "compression type and level on a sample of the training files. "
+        "The results are written to compression_benchmark.json "
+        "in the output area. "
+        "To be used with the data generator.",
+        "type": bool,
+    },
+    "compression_benchmark_files_no": {
+        "default": 4,
+        "help": "Number of training files in the compression benchmark. "
+        "To be used with the data generator.",
+        "type": click.IntRange(min=1),
+    },
+    "compression_benchmark_size_tolerance": {
+        "default": 1.5,
+        "help": "The recommended setting is the fastest to read among the "
+        "settings at most this many times bigger than the smallest one. "
+        "To be used with the data generator.",
+        "type": click.FloatRange(min=1),
+    },
+    "generator_executor": {
+        "default": "thread",
+        "help": "Kind of the workers writing the TFRecord files. "
+        "The process workers get a snapshot of the frozen config. "
+        "To be used with the data generator.",
+        "type": click.Choice(
+            [
+                "thread",
+                "process",
+            ]
+        ),
+    },
+}
+
+TRANSCODER_OPTIONS = {
+    "transcoder_source_files": {
+        "default": None,
+        "help": "Directory of the TFRecord files to transcode.",
+        "type": click.Path(exists=True),
+    },
+    "transcoder_destination_files": {
+        "default": None,
+        "help": "Directory of the transcoded TFRecord files.",
+        "type": click.Path(exists=True),
+    },
+    "transcoder_source_compression_type": {
+        **DATA_OPTIONS["tfrecord_compression_type"],
+        "default": None,
+        "help": "Compression type of the TFRecord files to transcode. "
+        "Read from their manifest if they have one, so only needed "
+        "for files without a manifest.",
+    },
+    "transcoder_compression_type": {
+        **DATA_OPTIONS["tfrecord_compression_type"],
+        "default": "ZLIB",
+        "help": "Compression type of the transcoded TFRecord files.",
+    },
+    "transcoder_compression_level": {
+        **DATA_OPTIONS["tfrecord_compression_level"],
+        "default": 1,
+        "help": "Compression level of the transcoded TFRecord files.",
+    },
+    "transcoder_workers": {
+        "default": os.cpu_count(),
+        "help": "Number of files transcoded in parallel.",
+        "type": click.IntRange(min=1),
+    },
 }
 
 CONVERTER_OPTIONS = {
@@ -241,12 +520,150 @@ CONVERTER_OPTIONS = {
         "help": "Path to the model to convert.",
         "type": click.Path(),
     },
+    "converter_submodel": {
+        "default": None,
+        "help": "Attribute of the model to convert, e.g. 'decoder'. "
+        "The whole model is converted if not provided.",
+        "type": str,
+    },
+    "converter_opset": {
+        "default": 18,
+        "help": "ONNX opset of the converted model.",
+        "type": click.IntRange(min=1),
+    },
+    "onnx_optimization_level": {
+        "default": "none",
+        "help": "onnxruntime graph optimization level of an optimized "
+        "copy of the converted model, model.optimized.onnx.",
+        "type": click.Choice(["none", "basic", "extended", "all"]),
+    },
+    "onnx_quantization": {
+        "default": "none",
+        "help": "int8 quantization of a copy of the converted model, "
+        "model.<mode>_int8.onnx: 'dynamic' quantizes the weights, "
+        "'static' the activations too, calibrated on training samples.",
+        "type": click.Choice(["none", "dynamic", "static"]),
+    },
+    "onnx_calibration_samples": {
+        "default": 128,
+        "help": "Number of training samples calibrating "
+        "the static quantization.",
+        "type": click.IntRange(min=1),
+    },
+    "onnx_benchmark": {
+        "default": False,
+        "help": "Time the converted model with onnxruntime on the CPU "
+        "for every batch size and number of threads. The inputs are "
+        "taken from the test files, and the results are written to "
+        "onnx_benchmark.json in the output area.",
+        "type": bool,
+    },
+    "onnx_benchmark_batch_sizes": {
+        "default": (1, 8, 32),
+        "help": "Batch sizes of the onnxruntime benchmark.",
+        "type": click.IntRange(min=1),
+        "multiple": True,
+    },
+    "onnx_benchmark_threads": {
+        "default": (1, os.cpu_count()),
+        "help": "Numbers of intra-op threads of the onnxruntime benchmark.",
+        "type": click.IntRange(min=1),
+        "multiple": True,
+    },
+    "onnx_benchmark_repeats": {
+        "default": 20,
+        "help": "Number of timed runs per setting "
+        "of the onnxruntime benchmark.",
+        "type": click.IntRange(min=1),
+    },
+    "onnx_parity_samples": {
+        "default": 64,
+        "help": "Number of test samples on which the outputs of the "
+        "converted model are compared with the Keras model, and the "
+        "outputs of the optimized or quantized models with the "
+        "converted one. No comparison if there are no test files.",
+        "type": click.IntRange(min=0),
+    },
+    "onnx_parity_tolerance": {
+        "default": 1e-4,
+        "help": "Relative and absolute tolerance of the comparison "
+        "with the Keras model.",
+        "type": click.FloatRange(min=0),
+    },
 }
 
 EVALUATION_OPTIONS = {
     "model_path": {
         "default": None,
-        "help": "Path to the model weights.",
-        "type": click.Path(),
+        "help": "Path to the model weights. Several checkpoints can be "
+        "evaluated at once, with comma separated paths or glob patterns, "
+        "e.g. 'checkpoints/*.index'. The decoded test data is then cached "
+        "in memory, unless a dataset cache is set.",
+        "type": str,
+    },
+    "evaluation_workers": {
+        "default": 1,
+        "help": "Number of checkpoints evaluated in parallel threads.",
+        "type": click.IntRange(min=1),
+    },
+    "batch_size": TRAINING_OPTIONS["batch_size"],
+    "precision_policy": TRAINING_OPTIONS["precision_policy"],
+    "jit_compile": TRAINING_OPTIONS["jit_compile"],
+}
+
+PREDICTION_OPTIONS = {
+    "tfrecord_prediction_files": {
+        "default": None,
+        "help": "TFRecord files to predict on, read by the TFRecord "
+        "dataloader. Their order is kept, unless the records are read "
+        "out of order.",
+        "type": click.Path(exists=True),
+    },
+    "prediction_output_files": {
+        "default": None,
+        "help": "Directory of the TFRecord shards of the predictions, "
+        "one record per input element.",
+        "type": click.Path(exists=True),
+    },
+    "prediction_backend": {
+        "default": "keras",
+        "help": "Backend running the model: 'keras' with the weights of "
+        "the model path, or 'onnx' with onnxruntime on the CPU and the "
+        "ONNX model of the model path, e.g. written by the converter.",
+        "type": click.Choice(["keras", "onnx"]),
+    },
+    "model_path": {
+        "default": None,
+        "help": "Path to the model weights, or to the ONNX model "
+        "with the 'onnx' backend.",
+        "type": str,
+    },
+    "prediction_shard_size": {
+        "default": 10000,
+        "help": "Number of records per prediction shard.",
+        "type": click.IntRange(min=1),
+    },
+    "prediction_workers": {
+        "default": 2,
+        "help": "Number of threads encoding and writing the prediction "
+        "shards while the next batches are read and predicted.",
+        "type": click.IntRange(min=1),
+    },
+    "prediction_threads": {
+        "default": None,
+        "help": "Number of intra-op threads of the 'onnx' backend. "
+        "Chosen by onnxruntime if not provided.",
+        "type": click.IntRange(min=1),
+    },
+    "prediction_compression_type": {
+        **DATA_OPTIONS["tfrecord_compression_type"],
+        "help": "Compression type of the prediction shards.",
+    },
+    "prediction_compression_level": {
+        **DATA_OPTIONS["tfrecord_compression_level"],
+        "help": "Compression level of the prediction shards.",
     },
+    "batch_size": TRAINING_OPTIONS["batch_size"],
+    "precision_policy": TRAINING_OPTIONS["precision_policy"],
+    "jit_compile": TRAINING_OPTIONS["jit_compile"],
 }
@@ -1,16 +1,14 @@
 import click
-import pyfiglet as pf
 from core.constants import (
     PROJECT_NAME,
     PROJECT_DESCRIPTION,
-    ACTIVE_MODEL_NAMES,
 )
-from core.utils import set_default_options, add_options
-from core.model import model_cli_generator
-from core.train import train_cli_generator
-from core.generate import data_generator_cli_generator
-from core.convert import converter_cli_generator
-from core.evaluate import evaluate_cli_generator
+from core.utils import (
+    LazyGroup,
+    lazy_command,
+    set_default_options,
+    add_options,
+)
 
 
 def cli_generator():
@@ -42,29 +40,24 @@ def cli_generator():
     return _cli
 
 
+# the actions and the models are only imported when invoked
 cli = click.group(
-    cli_generator(),
+    cls=LazyGroup,
+    lazy_commands={
+        "train": lazy_command("core.train:train_cli_generator"),
+        "generate": lazy_command("core.generate:data_generator_cli_generator"),
+        "convert": lazy_command("core.convert:converter_cli_generator"),
+        "evaluate": lazy_command("core.evaluate:evaluate_cli_generator"),
+        "transcode": lazy_command("core.compression:transcoder_cli_generator"),
+        "predict": lazy_command("core.predict:predict_cli_generator"),
+    },
     context_settings={"show_default": True},
-)
-
-train_cli = train_cli_generator()
-data_generator_cli = data_generator_cli_generator()
-converter_cli = converter_cli_generator()
-evaluate_cli = evaluate_cli_generator()
-
-for model_name in ACTIVE_MODEL_NAMES:
-    model_cli = model_cli_generator(model_name=model_name)
-    train_cli.add_command(model_cli)
-    data_generator_cli.add_command(model_cli)
-    converter_cli.add_command(model_cli)
-    evaluate_cli.add_command(model_cli)
-cli.add_command(train_cli)
-cli.add_command(data_generator_cli)
-cli.add_command(converter_cli)
-cli.add_command(evaluate_cli)
+)(cli_generator())
 
 
 if __name__ == "__main__":
+    import pyfiglet as pf
+
     click.secho(
         pf.figlet_format(PROJECT_NAME),
         fg="blue",
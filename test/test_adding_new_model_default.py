@@ -21,3 +21,31 @@ def test_adding_new_model_default():
         config.check_readiness()
     del Config.instance
     output_area.cleanup()
+
+
+def test_replacing_model_option():
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        model_name="test",
+    )
+    options_no = len(config.options())
+    config.model_options["test_option3"] = {
+        "help": "Test option3",
+        "default": "test",
+    }
+    assert "test_option3" in config.options()
+    # the same number of options, with another key
+    del config.model_options["test_option3"]
+    config.model_options["test_option4"] = {
+        "help": "Test option4",
+        "default": "test",
+    }
+    assert "test_option3" not in config.options()
+    assert "test_option4" in config.options()
+    del config.model_options["test_option4"]
+    assert len(config.options()) == options_no
+    del Config.instance
+    output_area.cleanup()
@@ -0,0 +1,53 @@
+import pytest
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.dataset import generate_tfrecord_dataloader
+from models.test.dataset import generate_tfrecord_decoder
+
+
+@pytest.mark.parametrize("encoding", ["float_list", "raw"])
+def test_batched_decoding(encoding):
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.encoding = encoding
+    config.generator_training_files_no = 2
+    config.generator_training_samples_no_per_file = 10
+    config.generator_samples_no_per_example = 2
+    config.tfrecord_training_files = training_dir.name
+    config.tfrecord_validation_files = training_dir.name
+    assert run()
+    config._unfreeze()
+    config.batch_size = 4
+    batches = list(
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+        .batch(4)
+        .as_numpy_iterator()
+    )
+    # the decoder parses whole batches of serialized records
+    config.batched_decoding = True
+    batched = list(
+        generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )().as_numpy_iterator()
+    )
+    assert len(batched) == len(batches) == 3
+    for (x, y), (batched_x, batched_y) in zip(batches, batched):
+        assert batched_x.shape == x.shape
+        assert (batched_x == x).all()
+        assert (batched_y == y).all()
+    assert batched[0][0].shape == (4, 2) + tuple(config.input_shape)
+
+    # the training does not batch the datasets again
+    config.set_action("train", ignore_already_set=True)
+    assert run()
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
@@ -0,0 +1,35 @@
+import os
+import json
+import tempfile
+import subprocess
+
+
+def test_benchmarks_in_one_process():
+    output = tempfile.TemporaryDirectory()
+    results_file = os.path.join(output.name, "results.json")
+    ex_benchmark = subprocess.run(
+        [
+            "python",
+            "-m",
+            "benchmarks.benchmark",
+            "--benchmark",
+            "tfrecord_write",
+            "--benchmark",
+            "tfrecord_read",
+            "--files_no",
+            "2",
+            "--samples_no",
+            "5",
+            "--output",
+            results_file,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert ex_benchmark.returncode == 0
+    with open(results_file) as f:
+        results = json.load(f)["results"]
+    assert results["tfrecord_write_files_per_second"]["value"] > 0
+    assert results["tfrecord_read_decode_throughput"]["value"] > 0
+    output.cleanup()
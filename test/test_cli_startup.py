@@ -0,0 +1,48 @@
+import subprocess
+
+# modules which must only be imported once an action is invoked
+LAZY_MODULES = [
+    "tensorflow",
+    "git",
+    "yaml",
+    "pyfiglet",
+    "core.train",
+    "core.generate",
+    "core.convert",
+    "core.evaluate",
+    "models.test.options",
+]
+# seconds, for importing the CLI
+IMPORT_TIME_BUDGET = 0.5
+
+
+def test_cli_startup():
+    ex_import = subprocess.run(
+        [
+            "python",
+            "-c",
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import run\n"
+            "print(time.perf_counter() - start)\n"
+            "print(' '.join(sys.modules))",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    import_time, modules = ex_import.stdout.splitlines()
+    modules = modules.split()
+    for module in LAZY_MODULES:
+        assert module not in modules
+    assert float(import_time) < IMPORT_TIME_BUDGET
+
+    ex_help = subprocess.run(
+        ["python", "run.py", "--help"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert ex_help.returncode == 0
+    for action in ["train", "generate", "convert", "evaluate"]:
+        assert ex_help.stdout.find(action) != -1
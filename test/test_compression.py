@@ -0,0 +1,82 @@
+import os
+import json
+import shutil
+import pytest
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.compression import (
+    COMPRESSION_BENCHMARK_FILE,
+    COMPRESSION_SETTINGS,
+    transcode,
+)
+from core.dataset import generate_tfrecord_dataloader
+from models.test.dataset import generate_tfrecord_decoder
+
+
+def test_compression():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    transcoded_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 3
+    config.generator_training_samples_no_per_file = 20
+    config.tfrecord_training_files = training_dir.name
+    config.compression_benchmark = True
+    config.compression_benchmark_files_no = 2
+    assert run()
+    with open(os.path.join(output_area.name, COMPRESSION_BENCHMARK_FILE)) as f:
+        benchmark = json.load(f)
+    assert len(benchmark["files"]) == 2
+    assert len(benchmark["results"]) == len(COMPRESSION_SETTINGS)
+    assert benchmark["recommended"] in benchmark["results"]
+
+    config._unfreeze()
+    config.transcoder_source_files = training_dir.name
+    config.transcoder_destination_files = transcoded_dir.name
+    config.transcoder_compression_type = ""
+    transcode()
+    assert sorted(os.listdir(transcoded_dir.name)) == sorted(
+        os.listdir(training_dir.name)
+    )
+    elements = list(
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+    )
+    config.tfrecord_training_files = transcoded_dir.name
+    config.tfrecord_compression_type = ""
+    transcoded_elements = list(
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+    )
+    assert len(transcoded_elements) == len(elements) == 60
+    for (x, _), (transcoded_x, _) in zip(elements, transcoded_elements):
+        assert (x.numpy() == transcoded_x.numpy()).all()
+
+    # without a manifest, the source compression type must be given
+    os.remove(os.path.join(training_dir.name, "manifest.json"))
+    shutil.rmtree(transcoded_dir.name)
+    os.makedirs(transcoded_dir.name)
+    config.transcoder_source_compression_type = None
+    with pytest.raises(ValueError):
+        transcode()
+    config.transcoder_source_compression_type = "GZIP"
+    transcode()
+    assert (
+        len(
+            list(
+                generate_tfrecord_dataloader(
+                    generate_tfrecord_decoder(), "training"
+                )()
+            )
+        )
+        == 60
+    )
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    transcoded_dir.cleanup()
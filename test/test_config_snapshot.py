@@ -0,0 +1,55 @@
+import os
+import pickle
+import pytest
+import tempfile
+from core.config import Config
+from core.dataset import (
+    MANIFEST_FILE,
+    generate_tfrecord_datagenerator,
+    generate_tfrecord_dataloader,
+)
+from models.test.dataset import (
+    generate_tfrecord_encoder,
+    generate_tfrecord_decoder,
+)
+
+
+def test_config_snapshot():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.tfrecord_training_files = training_dir.name
+    config.generator_workers = 2
+    config.generator_executor = "process"
+    with pytest.raises(ValueError):
+        config.snapshot()
+    config._freeze()
+    snapshot = pickle.loads(pickle.dumps(config.snapshot()))
+    assert snapshot.input_shape == config.input_shape
+    assert snapshot._model_name == "test"
+    with pytest.raises(AttributeError):
+        snapshot.input_shape = (2, 2)
+
+    generate_tfrecord_datagenerator(
+        generate_tfrecord_encoder(files_no=3, samples_no=10, config=snapshot),
+        "training",
+        config=snapshot,
+    )()
+    file_names = os.listdir(training_dir.name)
+    assert len([name for name in file_names if name.endswith(".tf")]) == 3
+    assert MANIFEST_FILE in file_names
+    dataset = generate_tfrecord_dataloader(
+        generate_tfrecord_decoder(config=snapshot),
+        "training",
+        config=snapshot,
+    )()
+    assert len(list(dataset)) == 30
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
@@ -0,0 +1,64 @@
+import os
+import json
+import pytest
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.onnx_runtime import ONNX_BENCHMARK_FILE
+
+
+def test_convert():
+    pytest.importorskip("tf2onnx")
+    pytest.importorskip("onnxruntime")
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    test_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 2
+    config.generator_training_samples_no_per_file = 10
+    config.tfrecord_training_files = training_dir.name
+    config.tfrecord_validation_files = training_dir.name
+    config.generator_test_files_no = 2
+    config.generator_test_samples_no_per_file = 10
+    config.tfrecord_test_files = test_dir.name
+    config.generator_samples_no_per_example = 5
+    assert run()
+    config._unfreeze()
+    config.set_action("train", ignore_already_set=True)
+    config.model_checkpoint = True
+    config.model_checkpoint_save_best_only = False
+    assert run()
+
+    config._unfreeze()
+    config.set_action("convert", ignore_already_set=True)
+    config.converter_model_path = config.model_checkpoint_out_weight_file
+    config.onnx_benchmark = True
+    config.onnx_benchmark_batch_sizes = (1, 4)
+    config.onnx_benchmark_threads = (1,)
+    config.onnx_benchmark_repeats = 2
+    config.onnx_optimization_level = "basic"
+    config.onnx_quantization = "static"
+    config.onnx_calibration_samples = 3
+    assert run()
+    assert os.path.exists(os.path.join(output_area.name, "model.onnx"))
+    with open(os.path.join(output_area.name, ONNX_BENCHMARK_FILE)) as f:
+        results = json.load(f)
+    assert results["parity"]["passed"]
+    assert results["parity"]["samples"] == 4
+    assert [result["batch_size"] for result in results["benchmark"]] == [1, 4]
+    assert len(results["keras_benchmark"]) == 2
+    assert sorted(results["artifacts"]) == ["optimized", "static_int8"]
+    for artifact in results["artifacts"].values():
+        assert os.path.exists(artifact["path"])
+        assert "target_mean_abs_error_delta" in artifact["comparison"]
+        assert len(artifact["benchmark"]) == 2
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    test_dir.cleanup()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.dataset import _dataset_cache_path, generate_tfrecord_dataloader
+from models.test.dataset import generate_tfrecord_decoder
+
+
+def test_dataset_cache():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    cache_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 2
+    config.generator_training_samples_no_per_file = 5
+    config.tfrecord_training_files = training_dir.name
+    assert run()
+    config._unfreeze()
+
+    def elements():
+        return [
+            x
+            for x, _ in generate_tfrecord_dataloader(
+                generate_tfrecord_decoder(), "training"
+            )().as_numpy_iterator()
+        ]
+
+    uncached = elements()
+    assert len(uncached) == 10
+    config.dataset_cache = "memory"
+    assert len(elements()) == 10
+
+    config.dataset_cache = cache_dir.name
+    files = sorted(
+        os.path.join(training_dir.name, file_name)
+        for file_name in os.listdir(training_dir.name)
+        if file_name.endswith(".tf")
+    )
+    cache_path = _dataset_cache_path(config, "training", files)
+    assert os.path.dirname(cache_path) == cache_dir.name
+    cached = elements()
+    assert len(cached) == 10
+    for x, cached_x in zip(uncached, cached):
+        assert (x == cached_x).all()
+    # written by the first pass, read by the next ones
+    cache_files = os.listdir(cache_dir.name)
+    assert any(
+        file_name.startswith(os.path.basename(cache_path))
+        for file_name in cache_files
+    )
+    assert len(elements()) == 10
+    assert os.listdir(cache_dir.name) == cache_files
+
+    # a modified file is not served from the stale cache
+    modification_time = os.path.getmtime(files[0])
+    os.utime(files[0], (0, 0))
+    assert _dataset_cache_path(config, "training", files) != cache_path
+    os.utime(files[0], (modification_time, modification_time))
+    assert _dataset_cache_path(config, "training", files) == cache_path
+    # nor the serialized records cached with the batched decoding,
+    # whatever the batch size
+    config.batched_decoding = True
+    batched_cache_path = _dataset_cache_path(config, "training", files)
+    assert batched_cache_path != cache_path
+    config.batch_size = 5
+    assert _dataset_cache_path(config, "training", files) == (
+        batched_cache_path
+    )
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    cache_dir.cleanup()
@@ -0,0 +1,96 @@
+import os
+import json
+import socket
+import tempfile
+import subprocess
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def test_multi_worker_training():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    validation_dir = tempfile.TemporaryDirectory()
+
+    # the files are split evenly, so that all workers run the same steps
+    subprocess.run(
+        [
+            "python",
+            "run.py",
+            "--output_area",
+            str(output_area.name),
+            "generate",
+            "--tfrecord_training_files",
+            str(training_dir.name),
+            "--tfrecord_validation_files",
+            str(validation_dir.name),
+            "test",
+            "--generator_training_files_no",
+            "4",
+            "--generator_training_samples_no_per_file",
+            "10",
+            "--generator_validation_files_no",
+            "2",
+            "--generator_validation_samples_no_per_file",
+            "10",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+    workers_no = 2
+    cluster = {
+        "worker": [f"localhost:{get_free_port()}" for _ in range(workers_no)]
+    }
+    workers = []
+    logs = []
+    for index in range(workers_no):
+        env = dict(os.environ)
+        env["TF_CONFIG"] = json.dumps(
+            {"cluster": cluster, "task": {"type": "worker", "index": index}}
+        )
+        env["CUDA_VISIBLE_DEVICES"] = ""
+        # files instead of pipes, a blocked worker would block all others
+        logs.append(tempfile.TemporaryFile(mode="w+"))
+        workers.append(
+            subprocess.Popen(
+                [
+                    "python",
+                    "run.py",
+                    "--verbosity",
+                    "DEBUG",
+                    "--output_area",
+                    f"{output_area.name}/worker_{index}",
+                    "train",
+                    "--tfrecord_training_files",
+                    str(training_dir.name),
+                    "--tfrecord_validation_files",
+                    str(validation_dir.name),
+                    "--distribution_strategy",
+                    "multi_worker_mirrored",
+                    "--epochs",
+                    "2",
+                    "test",
+                ],
+                env=env,
+                stdout=logs[-1],
+                stderr=subprocess.DEVNULL,
+                text=True,
+            )
+        )
+    for worker, log in zip(workers, logs):
+        assert worker.wait(timeout=300) == 0
+        log.seek(0)
+        stdout = log.read()
+        log.close()
+        assert stdout.find("Finished training the 'test' model.") != -1
+        assert stdout.find("with 2 replica(s).") != -1
+
+    output_area.cleanup()
+    training_dir.cleanup()
+    validation_dir.cleanup()
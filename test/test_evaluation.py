@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.evaluate import EVALUATION_FILE, evaluate
+from core.dataset import generate_tfrecord_dataloader
+from models.test.dataset import generate_tfrecord_decoder
+from models.test.model import generate_model
+from models.test.loss import generate_loss
+
+
+def test_evaluation():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    test_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 2
+    config.generator_training_samples_no_per_file = 10
+    config.tfrecord_training_files = training_dir.name
+    config.tfrecord_validation_files = training_dir.name
+    config.generator_test_files_no = 3
+    config.generator_test_samples_no_per_file = 20
+    config.tfrecord_test_files = test_dir.name
+    config.generator_samples_no_per_example = 5
+    assert run()
+    config._unfreeze()
+    config.set_action("train", ignore_already_set=True)
+    config.model_checkpoint = True
+    config.model_checkpoint_save_best_only = False
+    assert run()
+
+    config._unfreeze()
+    config.set_action("evaluate", ignore_already_set=True)
+    config.model_path = config.model_checkpoint_out_weight_file
+    config.batch_size = 5
+    assert run()
+    import tensorflow as tf
+
+    # a second checkpoint, evaluated in parallel with the first one
+    for file_name in os.listdir(output_area.name):
+        if file_name.startswith("model_with_weights.tf."):
+            shutil.copy(
+                os.path.join(output_area.name, file_name),
+                os.path.join(
+                    output_area.name,
+                    file_name.replace("model_with_weights", "copy"),
+                ),
+            )
+    config._unfreeze()
+    config.model_path = os.path.join(output_area.name, "*.index")
+    config.evaluation_workers = 2
+    results = evaluate(
+        generate_model,
+        generate_loss,
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "test")(),
+        lambda: [tf.keras.metrics.MeanAbsoluteError(name="mae")],
+    )
+    assert sorted(results) == [
+        os.path.join(output_area.name, "copy.tf"),
+        os.path.join(output_area.name, "model_with_weights.tf"),
+    ]
+    for values in results.values():
+        assert values["samples"] == 12
+        assert values["loss"] == values["mae"] == 0
+        assert values["samples_per_second"] > 0
+    with open(os.path.join(output_area.name, EVALUATION_FILE)) as f:
+        assert len(f.readlines()) == 3
+    assert os.path.exists(os.path.join(output_area.name, "metrics.jsonl"))
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    test_dir.cleanup()
+
+
+def test_evaluation_partial_batch():
+    import numpy as np
+    import tensorflow as tf
+
+    def generate_dense_model():
+        inputs = tf.keras.Input((4,))
+        return tf.keras.Model(inputs, tf.keras.layers.Dense(4)(inputs))
+
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="evaluate",
+        model_name="test",
+    )
+    model = generate_dense_model()
+    config.model_path = os.path.join(output_area.name, "dense.tf")
+    model.save_weights(config.model_path)
+    # 23 samples, in batches of 5 and a last batch of 3
+    config.batch_size = 5
+    generator = np.random.default_rng(0)
+    x = generator.normal(size=(23, 4)).astype("float32")
+    y = generator.normal(size=(23, 4)).astype("float32")
+    dataset = tf.data.Dataset.from_tensor_slices((x, y))
+    results = evaluate(
+        generate_dense_model,
+        lambda: tf.keras.losses.MeanSquaredError(),
+        dataset,
+    )[config.model_path]
+    model.compile(loss=tf.keras.losses.MeanSquaredError())
+    expected = model.evaluate(dataset.batch(5), verbose=0)
+    assert results["samples"] == 23
+    assert np.isclose(results["loss"], expected, rtol=1e-5)
+    assert np.isclose(results["loss"], np.mean((model(x) - y) ** 2))
+    del Config.instance
+    output_area.cleanup()
@@ -0,0 +1,72 @@
+import os
+import threading
+import tempfile
+import core.dataset
+from core.config import Config
+from core.dataset import (
+    generate_tfrecord_datagenerator,
+    read_tfrecord_manifest,
+)
+from test.test_sharding import generate_numbered_encoder
+
+
+def test_generator_workers(monkeypatch):
+    import tensorflow as tf
+
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    config.generator_workers = 3
+    # the writer thread of every file
+    writers = {}
+    write_tfrecord_file = core.dataset._write_tfrecord_file
+
+    def recording_write_tfrecord_file(file_path, *args):
+        writers[os.path.basename(file_path)] = threading.current_thread().name
+        return write_tfrecord_file(file_path, *args)
+
+    monkeypatch.setattr(
+        core.dataset, "_write_tfrecord_file", recording_write_tfrecord_file
+    )
+    samples_nos = [3, 1, 4, 1, 5, 9, 2]
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder(samples_nos), "training"
+    )()
+
+    # the i-th file is written by the (i % workers_no)-th worker
+    assert len(writers) == len(samples_nos)
+    for file_no in range(len(samples_nos)):
+        assert writers[f"{file_no}.tf"].startswith(
+            f"tfrecord_writer_{file_no % 3}_"
+        )
+    # every file has its own examples, none lost or mixed up
+    manifest = read_tfrecord_manifest(data_dir.name)
+    assert {file["name"]: file["records"] for file in manifest["files"]} == {
+        f"{file_no}.tf": samples_no
+        for file_no, samples_no in enumerate(samples_nos)
+    }
+    first = 0
+    for file_no, samples_no in enumerate(samples_nos):
+        file_name = f"{file_no}.tf"
+        records = [
+            tf.train.Example.FromString(record.numpy())
+            .features.feature["x"]
+            .float_list.value[0]
+            for record in tf.data.TFRecordDataset(
+                os.path.join(data_dir.name, file_name),
+                compression_type=config.tfrecord_compression_type,
+            )
+        ]
+        assert records == list(range(first, first + samples_no))
+        first += samples_no
+
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
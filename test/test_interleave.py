@@ -0,0 +1,117 @@
+import click
+import pytest
+import tempfile
+from click.testing import CliRunner
+from core.config import Config
+from core.dataset import (
+    generate_tfrecord_datagenerator,
+    generate_tfrecord_dataloader,
+)
+from core.utils import add_options
+from models.test.dataset import generate_tfrecord_decoder
+from test.test_shuffle import generate_numbered_encoder
+
+
+def parse_options(*args) -> dict:
+    """
+    Parses the training options from the command line arguments.
+    """
+    parsed = {}
+
+    @click.command()
+    @add_options(mode="training")
+    def command(**kwargs):
+        parsed.update(kwargs)
+
+    result = CliRunner().invoke(command, args)
+    assert result.exit_code == 0, result.output
+    return parsed
+
+
+def test_autotune_options():
+    parsed = parse_options(
+        "--tfrecord_interleave_cycle_length",
+        "autotune",
+        "--tfrecord_num_parallel_calls",
+        "3",
+        "--tfrecord_num_parallel_reads",
+        "AUTOTUNE",
+        "--tfrecord_interleave_block_length",
+        "2",
+        "--tfrecord_deterministic",
+        "false",
+    )
+    assert parsed["tfrecord_interleave_cycle_length"] == "AUTOTUNE"
+    assert parsed["tfrecord_num_parallel_calls"] == 3
+    assert parsed["tfrecord_num_parallel_reads"] == "AUTOTUNE"
+    assert parsed["tfrecord_interleave_block_length"] == 2
+    assert parsed["tfrecord_deterministic"] is False
+    # the defaults
+    parsed = parse_options()
+    assert parsed["tfrecord_interleave_cycle_length"] is None
+    assert parsed["tfrecord_num_parallel_calls"] == "AUTOTUNE"
+    assert parsed["tfrecord_deterministic"] is True
+    # neither a word nor a non positive integer
+    for value in ["fast", "0"]:
+        result = CliRunner().invoke(
+            click.command()(add_options(mode="training")(lambda **_: None)),
+            ["--tfrecord_interleave_cycle_length", value],
+        )
+        assert result.exit_code != 0
+
+
+@pytest.mark.parametrize(
+    "cycle_length, block_length, num_parallel_calls",
+    [
+        ("1", "1", "4"),
+        # a block per file, so that the files are read one after another
+        ("2", "5", "AUTOTUNE"),
+        ("autotune", "5", "2"),
+    ],
+)
+def test_deterministic_interleave(
+    cycle_length, block_length, num_parallel_calls
+):
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder(files_no=4, samples_no=5), "training"
+    )()
+
+    def records():
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )()
+        return [int(x.numpy().ravel()[0]) for x, _ in dataset]
+
+    # the sequential reader
+    config.tfrecord_num_parallel_reads = 1
+    sequential = records()
+    assert sequential == list(range(20))
+
+    for name, value in parse_options(
+        "--tfrecord_interleave_cycle_length",
+        cycle_length,
+        "--tfrecord_interleave_block_length",
+        block_length,
+        "--tfrecord_num_parallel_calls",
+        num_parallel_calls,
+        "--tfrecord_deterministic",
+        "true",
+    ).items():
+        if name.startswith("tfrecord_") and "files" not in name:
+            setattr(config, name, value)
+    assert config.tfrecord_interleave_cycle_length in ("AUTOTUNE", 1, 2)
+    assert records() == sequential
+
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
@@ -0,0 +1,54 @@
+import os
+import logging
+import tempfile
+import textwrap
+import threading
+import subprocess
+from core.logger import activate_logger
+
+
+def test_async_logging():
+    output_area = tempfile.TemporaryDirectory()
+    script = textwrap.dedent(
+        f"""
+        from core.logger import activate_logger
+
+        logger = activate_logger(
+            directory="{output_area.name}",
+            logger_level="DEBUG",
+            asynchronous=True,
+        )
+        for record_no in range(1000):
+            logger.debug("record %d", record_no)
+        """
+    )
+    ex_logging = subprocess.run(
+        ["python", "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert ex_logging.returncode == 0
+    # the queued records are all written at exit
+    with open(os.path.join(output_area.name, "output.log")) as f:
+        lines = f.read().splitlines()
+    assert lines[-1].endswith("record 999")
+    assert sum("record" in line for line in lines) == 1000
+    output_area.cleanup()
+
+
+def test_logging_already_configured():
+    output_area = tempfile.TemporaryDirectory()
+    root = logging.getLogger()
+    handler = logging.NullHandler()
+    root.addHandler(handler)
+    threads_no = threading.active_count()
+    try:
+        activate_logger(directory=output_area.name, asynchronous=True)
+    finally:
+        root.removeHandler(handler)
+    # neither a listener thread nor a log file left behind
+    assert threading.active_count() == threads_no
+    assert not os.path.exists(os.path.join(output_area.name, "output.log"))
+    output_area.cleanup()
@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import pytest
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.dataset import MANIFEST_FILE, generate_tfrecord_dataloader
+from models.test.dataset import generate_tfrecord_decoder
+
+
+def test_manifest():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 4
+    config.generator_training_samples_no_per_file = 20
+    config.generator_samples_no_per_example = 5
+    config.tfrecord_training_files = training_dir.name
+    assert run()
+    with open(os.path.join(training_dir.name, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    assert manifest["records"] == 16
+    assert len(manifest["files"]) == 4
+    assert manifest["compression_type"] == config.tfrecord_compression_type
+    assert manifest["input_shape"] == list(config.input_shape)
+
+    # generated again in the same directory
+    config._unfreeze()
+    config.generator_training_files_no = 1
+    assert run()
+    dataset = generate_tfrecord_dataloader(
+        generate_tfrecord_decoder(), "training"
+    )()
+    assert dataset.cardinality().numpy() == 20
+    assert len(list(dataset)) == 20
+
+    # balanced between two workers
+    config._unfreeze()
+    config.data_workers_no = 2
+    cardinalities = []
+    for index in range(2):
+        config.data_worker_index = index
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )()
+        cardinalities.append(dataset.cardinality().numpy())
+    assert sorted(cardinalities) == [8, 12]
+    config.data_workers_no = None
+    config.data_worker_index = None
+
+    # a file added without updating the manifest is still read
+    shutil.copy(
+        os.path.join(training_dir.name, manifest["files"][0]["name"]),
+        os.path.join(training_dir.name, "unlisted.tf"),
+    )
+    dataset = generate_tfrecord_dataloader(
+        generate_tfrecord_decoder(), "training"
+    )()
+    assert dataset.cardinality().numpy() < 0
+    assert len(list(dataset)) == 24
+    os.remove(os.path.join(training_dir.name, "unlisted.tf"))
+
+    os.remove(os.path.join(training_dir.name, manifest["files"][0]["name"]))
+    with pytest.raises(FileNotFoundError):
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+
+
+def test_one_sample_per_example_by_default():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 2
+    config.generator_training_samples_no_per_file = 30
+    config.tfrecord_training_files = training_dir.name
+    assert run()
+    with open(os.path.join(training_dir.name, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    # one record per sample, batched by the dataloader
+    assert [file["records"] for file in manifest["files"]] == [30, 30]
+    config._unfreeze()
+    config.batch_size = 8
+    config.batched_decoding = True
+    batches = list(
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+    )
+    assert len(batches) == 8
+    assert tuple(batches[0][0].shape) == (8, 1) + tuple(config.input_shape)
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
@@ -0,0 +1,56 @@
+import os
+import json
+import pytest
+import tempfile
+from types import SimpleNamespace
+from core.metrics import METRICS_FILE, log_metrics, timed
+
+
+def test_metrics_log():
+    output_area = tempfile.TemporaryDirectory()
+    config = SimpleNamespace(
+        metrics_log=True,
+        output_area=output_area.name,
+        run_number="0",
+        _action="generate",
+        _model_name="test",
+    )
+    log_metrics("stage", config=config, value=1)
+    with timed("block", config=config, files=0) as metrics:
+        metrics["files"] += 2
+    with pytest.raises(RuntimeError):
+        with timed("broken", config=config):
+            raise RuntimeError()
+    config.metrics_log = False
+    log_metrics("disabled", config=config)
+
+    with open(os.path.join(output_area.name, METRICS_FILE)) as f:
+        records = [json.loads(line) for line in f]
+    assert [record["stage"] for record in records] == [
+        "stage",
+        "block",
+        "broken",
+    ]
+    assert records[0]["value"] == 1
+    assert records[0]["model_name"] == "test"
+    assert records[1]["files"] == 2
+    assert records[1]["status"] == "done"
+    assert records[1]["duration"] >= 0
+    assert records[2]["status"] == "failed"
+
+
+def test_metrics_log_missing_output_area():
+    output_area = tempfile.TemporaryDirectory()
+    warnings = []
+    config = SimpleNamespace(
+        metrics_log=True,
+        output_area=output_area.name,
+        run_number="0",
+        _action="generate",
+        _model_name="test",
+        log=SimpleNamespace(warning=warnings.append),
+    )
+    output_area.cleanup()
+    log_metrics("stage", config=config, value=1)
+    assert len(warnings) == 1
+    assert not os.path.exists(output_area.name)
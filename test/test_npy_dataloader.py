@@ -0,0 +1,60 @@
+from models.test.run import run
+from core.config import Config
+from core.dataset import (
+    generate_npy_dataloader,
+    generate_tfrecord_dataloader,
+)
+from models.test.dataset import generate_tfrecord_decoder
+import numpy as np
+import tempfile
+
+
+def test_npy_dataloader():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    npy_training_dir = tempfile.TemporaryDirectory()
+    npy_validation_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 3
+    config.generator_training_samples_no_per_file = 20
+    config.generator_samples_no_per_example = 5
+    config.tfrecord_training_files = training_dir.name
+    assert run()
+
+    # converted from the TFRecord files
+    config._unfreeze()
+    config.dataloader_type = "npy"
+    config.npy_training_files = npy_training_dir.name
+    config.npy_chunk_size = 3
+    assert run()
+    tfrecord_elements = list(
+        generate_tfrecord_dataloader(generate_tfrecord_decoder(), "training")()
+    )
+    npy_elements = list(generate_npy_dataloader("training")())
+    assert len(npy_elements) == len(tfrecord_elements) == 12
+    for (x, y), (npy_x, npy_y) in zip(tfrecord_elements, npy_elements):
+        np.testing.assert_array_equal(x, npy_x)
+        np.testing.assert_array_equal(y, npy_y)
+
+    # generated directly and trained on
+    config._unfreeze()
+    config.tfrecord_training_files = None
+    config.generator_training_files_no = None
+    config.generator_validation_files_no = 2
+    config.generator_validation_samples_no_per_file = 20
+    config.npy_validation_files = npy_validation_dir.name
+    assert run()
+    config._unfreeze()
+    config.set_action("train", ignore_already_set=True)
+    assert run()
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    npy_training_dir.cleanup()
+    npy_validation_dir.cleanup()
@@ -0,0 +1,90 @@
+import os
+import math
+import pytest
+import tempfile
+from core.config import Config
+from core.train import train
+from core.evaluate import evaluate
+
+
+def generate_trainable_model():
+    import tensorflow as tf
+
+    inputs = tf.keras.Input((4,))
+    x = tf.keras.layers.Dense(4)(inputs)
+    x = tf.keras.layers.Activation("linear", dtype="float32")(x)
+    return tf.keras.Model(inputs, x)
+
+
+def generate_dataset():
+    import numpy as np
+    import tensorflow as tf
+
+    generator = np.random.default_rng(0)
+    x = generator.normal(size=(32, 4)).astype("float32")
+    return tf.data.Dataset.from_tensor_slices((x, 2 * x))
+
+
+@pytest.mark.parametrize("jit_compile", [False, True])
+@pytest.mark.parametrize(
+    "precision_policy", ["float32", "mixed_float16", "mixed_bfloat16"]
+)
+def test_precision(precision_policy, jit_compile):
+    import tensorflow as tf
+
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.precision_policy = precision_policy
+    config.jit_compile = jit_compile
+    config.batch_size = 8
+    config.epochs = 2
+    config.model_checkpoint = True
+    config.model_checkpoint_save_best_only = False
+
+    class PrecisionCheck(tf.keras.callbacks.Callback):
+        def on_train_begin(self, logs=None):
+            self.compute_dtype = self.model.layers[1].compute_dtype
+            self.variable_dtype = self.model.layers[1].variable_dtype
+            self.loss_scaling = isinstance(
+                self.model.optimizer,
+                tf.keras.mixed_precision.LossScaleOptimizer,
+            )
+
+    check = PrecisionCheck()
+    try:
+        train(
+            generate_trainable_model,
+            tf.keras.losses.MeanSquaredError,
+            generate_dataset(),
+            generate_dataset(),
+            custom_callbacks=[check],
+        )
+        config.set_action("evaluate", ignore_already_set=True)
+        config.model_path = config.model_checkpoint_out_weight_file
+        results = evaluate(
+            generate_trainable_model,
+            tf.keras.losses.MeanSquaredError,
+            generate_dataset(),
+        )
+    finally:
+        tf.keras.mixed_precision.set_global_policy("float32")
+        del Config.instance
+    compute_dtype = {
+        "float32": "float32",
+        "mixed_float16": "float16",
+        "mixed_bfloat16": "bfloat16",
+    }[precision_policy]
+    assert check.compute_dtype == compute_dtype
+    assert check.variable_dtype == "float32"
+    assert check.loss_scaling == (precision_policy == "mixed_float16")
+    (values,) = results.values()
+    assert values["samples"] == 32
+    assert math.isfinite(values["loss"])
+    assert os.path.exists(os.path.join(output_area.name, "evaluation.csv"))
+    output_area.cleanup()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+from models.test.run import run
+from core.config import Config
+from core.dataset import read_tfrecord_manifest
+
+
+def test_predict():
+    output_area = tempfile.TemporaryDirectory()
+    training_dir = tempfile.TemporaryDirectory()
+    prediction_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="generate",
+        model_name="test",
+    )
+    config.generator_training_files_no = 3
+    config.generator_training_samples_no_per_file = 10
+    config.generator_samples_no_per_example = 2
+    config.tfrecord_training_files = training_dir.name
+    config.tfrecord_validation_files = training_dir.name
+    assert run()
+    config._unfreeze()
+    config.set_action("train", ignore_already_set=True)
+    config.model_checkpoint = True
+    config.model_checkpoint_save_best_only = False
+    assert run()
+
+    config._unfreeze()
+    config.set_action("predict", ignore_already_set=True)
+    config.model_path = config.model_checkpoint_out_weight_file
+    config.tfrecord_prediction_files = training_dir.name
+    config.prediction_output_files = prediction_dir.name
+    config.prediction_shard_size = 4
+    config.batch_size = 3
+    assert run()
+    import numpy as np
+    import tensorflow as tf
+
+    # 15 examples of 2 samples, one prediction per example
+    file_names = sorted(
+        file_name
+        for file_name in os.listdir(prediction_dir.name)
+        if file_name.endswith(".tf")
+    )
+    assert file_names == [f"predictions-{index:05d}.tf" for index in range(4)]
+    manifest = read_tfrecord_manifest(prediction_dir.name)
+    assert [file["records"] for file in manifest["files"]] == [4, 4, 4, 3]
+    records = list(
+        tf.data.TFRecordDataset(
+            [os.path.join(prediction_dir.name, name) for name in file_names],
+            compression_type=config.prediction_compression_type,
+        ).map(
+            lambda record: tf.io.parse_single_example(
+                record,
+                {
+                    "prediction": tf.io.FixedLenFeature(
+                        [2 * 4 * 4], dtype=tf.float32
+                    )
+                },
+            )["prediction"]
+        )
+    )
+    assert len(records) == 15
+    assert np.all(np.isfinite(records))
+    del Config.instance
+    output_area.cleanup()
+    training_dir.cleanup()
+    prediction_dir.cleanup()
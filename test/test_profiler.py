@@ -0,0 +1,59 @@
+import os
+import csv
+import json
+import pytest
+import tempfile
+from core.config import Config
+from core.train import train
+from models.test.model import generate_model
+from models.test.loss import generate_loss
+
+
+@pytest.mark.parametrize("training_loop", ["keras", "custom"])
+def test_throughput_profiler(training_loop):
+    import numpy as np
+    import tensorflow as tf
+
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.training_loop = training_loop
+    config.throughput_profiler = True
+    config.throughput_profiler_sampling_interval = 2
+    config.batch_size = 2
+    config.epochs = 2
+    dataset = tf.data.Dataset.from_tensor_slices(
+        (np.ones((12, 4, 4), "float32"), np.ones((12, 4, 4), "float32"))
+    )
+    train(generate_model, generate_loss, dataset, dataset)
+
+    with open(os.path.join(output_area.name, "profile.json")) as f:
+        report = json.load(f)
+    with open(os.path.join(output_area.name, "profile.csv")) as f:
+        records = list(csv.DictReader(f))
+    # 6 batches per epoch, every second one sampled
+    assert report["steps"] == 12
+    assert report["sampled_batches"] == len(records) == 6
+    assert report["samples_per_second"] > 0
+    times = ["batch_time", "host_time"]
+    if training_loop == "custom":
+        times += ["data_wait_time", "step_time"]
+    assert sorted(report["percentiles"]) == sorted(times)
+    assert list(records[0]) == [
+        "epoch",
+        "batch",
+        "steps",
+        *times,
+        "samples_per_second",
+    ]
+    for record in records:
+        assert float(record["batch_time"]) > 0
+        for name in times[2:]:
+            assert float(record[name]) >= 0
+    del Config.instance
+    output_area.cleanup()
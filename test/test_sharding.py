@@ -0,0 +1,123 @@
+import logging
+import tempfile
+import pytest
+from core.config import Config
+from core.dataset import (
+    generate_tfrecord_datagenerator,
+    generate_tfrecord_dataloader,
+)
+from models.test.dataset import generate_tfrecord_decoder
+
+
+def generate_numbered_encoder(samples_nos: list):
+    """
+    Examples filled with their number, in files of the given sizes.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    def examples(first, samples_no):
+        for example_no in range(first, first + samples_no):
+            feature = tf.train.Feature(
+                float_list=tf.train.FloatList(
+                    value=np.full(16, example_no, "<f4")
+                )
+            )
+            yield tf.train.Example(
+                features=tf.train.Features(
+                    feature={"x": feature, "y": feature}
+                )
+            )
+
+    def encoder():
+        first = 0
+        for file_no, samples_no in enumerate(samples_nos):
+            yield f"{file_no}.tf", examples(first, samples_no)
+            first += samples_no
+
+    return encoder
+
+
+def read_shards(config, workers_no: int) -> list:
+    shards = []
+    for worker_index in range(workers_no):
+        config.data_worker_index = worker_index
+        config.data_workers_no = workers_no
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), "training"
+        )()
+        shards.append([int(x.numpy().ravel()[0]) for x, _ in dataset])
+    return shards
+
+
+@pytest.mark.parametrize(
+    "samples_nos, workers_no, interleave_cycle_length",
+    [
+        # records sharded, fewer files than workers
+        ([5, 5, 5], 4, 0),
+        ([5, 5, 5], 4, 2),
+        # files sharded
+        ([5, 5, 5, 5], 2, 0),
+        ([5, 5, 5, 5], 2, 2),
+    ],
+)
+def test_sharding(samples_nos, workers_no, interleave_cycle_length, caplog):
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder(samples_nos), "training"
+    )()
+    # every worker shuffles the data on its own, without a seed
+    config.shuffle = True
+    config.shuffle_seed = None
+    config.tfrecord_deterministic = False
+    config.tfrecord_num_parallel_reads = "AUTOTUNE"
+    config.tfrecord_interleave_cycle_length = interleave_cycle_length
+
+    shards = read_shards(config, workers_no)
+    # the union of the shards is the dataset, without overlap
+    records = [record for shard in shards for record in shard]
+    assert sorted(records) == list(range(sum(samples_nos)))
+    assert all(shards)
+    assert ("Sharding the records" in caplog.text) == (
+        len(samples_nos) < workers_no
+    )
+    assert "badly unbalanced" not in caplog.text
+
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
+
+
+def test_unbalanced_shards(caplog):
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder([1, 1, 10]), "training"
+    )()
+
+    with caplog.at_level(logging.ERROR, logger="metahep"):
+        shards = read_shards(config, 2)
+    # logged, but still read
+    assert sorted(shards[0] + shards[1]) == list(range(12))
+    assert "badly unbalanced: from 2 to 10 records" in caplog.text
+
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
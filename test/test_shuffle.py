@@ -0,0 +1,128 @@
+import pytest
+import tempfile
+from core.config import Config
+from core.dataset import (
+    DEFAULT_SHUFFLE_BUFFER_SIZE,
+    _shuffle_buffer_size,
+    generate_tfrecord_datagenerator,
+    generate_tfrecord_dataloader,
+)
+from models.test.dataset import generate_tfrecord_decoder
+
+
+def generate_numbered_encoder(files_no: int, samples_no: int):
+    """
+    Examples filled with their number, in files named in their order.
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    def examples(file_no):
+        for example_no in range(samples_no):
+            value = np.full(16, file_no * samples_no + example_no, "<f4")
+            feature = tf.train.Feature(
+                float_list=tf.train.FloatList(value=value)
+            )
+            yield tf.train.Example(
+                features=tf.train.Features(
+                    feature={"x": feature, "y": feature}
+                )
+            )
+
+    def encoder():
+        for file_no in range(files_no):
+            yield f"{file_no}.tf", examples(file_no)
+
+    return encoder
+
+
+def test_shuffle():
+    import tensorflow as tf
+
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    config.tfrecord_test_files = data_dir.name
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder(files_no=4, samples_no=5), "training"
+    )()
+    config.shuffle = True
+    config.shuffle_seed = 0
+
+    def order(datatype):
+        dataset = generate_tfrecord_dataloader(
+            generate_tfrecord_decoder(), datatype
+        )()
+        return [int(x.numpy().ravel()[0]) for x, _ in dataset]
+
+    # only the training data is shuffled
+    training_order = order("training")
+    assert sorted(training_order) == list(range(20))
+    assert training_order != list(range(20))
+    assert order("test") == list(range(20))
+
+    # the size of the elements from the spec, without reading them
+    dataset = tf.data.Dataset.from_tensor_slices(tf.zeros((3, 256)))
+    config.shuffle_buffer_memory = 1
+    assert _shuffle_buffer_size(config, dataset) == 1024
+    # the default size for an empty dataset of unknown shape
+    dataset = tf.data.Dataset.from_generator(
+        lambda: iter([]), output_signature=tf.TensorSpec([None], tf.float32)
+    )
+    assert _shuffle_buffer_size(config, dataset) == (
+        DEFAULT_SHUFFLE_BUFFER_SIZE
+    )
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
+
+
+@pytest.mark.parametrize("dataset_cache", ["none", "memory"])
+def test_batched_shuffle(dataset_cache):
+    output_area = tempfile.TemporaryDirectory()
+    data_dir = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.tfrecord_training_files = data_dir.name
+    # a single file, so that only the records can be shuffled
+    generate_tfrecord_datagenerator(
+        generate_numbered_encoder(files_no=1, samples_no=20), "training"
+    )()
+    config.shuffle = True
+    config.shuffle_seed = 0
+    config.batched_decoding = True
+    config.batch_size = 4
+    config.dataset_cache = dataset_cache
+    dataset = generate_tfrecord_dataloader(
+        generate_tfrecord_decoder(), "training"
+    )()
+
+    def batches():
+        return [
+            sorted(int(value) for value in x.numpy().reshape(len(x), -1)[:, 0])
+            for x, _ in dataset
+        ]
+
+    sequential = [list(range(start, start + 4)) for start in range(0, 20, 4)]
+    # the records are shuffled across the batches, at every epoch
+    epochs = [batches(), batches()]
+    for epoch in epochs:
+        assert sorted(sum(epoch, [])) == list(range(20))
+        assert sorted(epoch) != sequential
+    assert epochs[0] != epochs[1]
+
+    del Config.instance
+    output_area.cleanup()
+    data_dir.cleanup()
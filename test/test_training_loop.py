@@ -0,0 +1,110 @@
+import pytest
+import tempfile
+from core.config import Config
+from core.train import train
+
+
+def generate_trainable_model():
+    import tensorflow as tf
+
+    inputs = tf.keras.Input((4,))
+    x = tf.keras.layers.Dense(4)(inputs)
+    # float32 outputs, also with the mixed precision
+    x = tf.keras.layers.Activation("linear", dtype="float32")(x)
+    return tf.keras.Model(inputs, x)
+
+
+def generate_dataset():
+    import numpy as np
+    import tensorflow as tf
+
+    generator = np.random.default_rng(0)
+    x = generator.normal(size=(48, 4)).astype("float32")
+    y = x @ generator.normal(size=(4, 4)).astype("float32")
+    # an unknown cardinality, as with the TFRecord dataloader
+    return tf.data.Dataset.from_tensor_slices((x, y)).filter(lambda *_: True)
+
+
+def generate_loss():
+    import tensorflow as tf
+
+    return tf.keras.losses.MeanSquaredError
+
+
+@pytest.mark.parametrize("training_loop", ["keras", "custom"])
+@pytest.mark.parametrize("steps_per_execution", [1, 3])
+@pytest.mark.parametrize("precision_policy", ["float32", "mixed_float16"])
+def test_training_loop(training_loop, steps_per_execution, precision_policy):
+    import tensorflow as tf
+
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.training_loop = training_loop
+    config.steps_per_execution = steps_per_execution
+    config.precision_policy = precision_policy
+    config.learning_rate = 0.05
+    config.epochs = 5
+    config.batch_size = 8
+    history = tf.keras.callbacks.History()
+    try:
+        train(
+            generate_trainable_model,
+            generate_loss(),
+            generate_dataset(),
+            generate_dataset(),
+            custom_callbacks=[history],
+        )
+    finally:
+        tf.keras.mixed_precision.set_global_policy("float32")
+        del Config.instance
+        output_area.cleanup()
+    losses = history.history["loss"]
+    assert len(losses) == 5
+    assert losses[-1] < 0.8 * losses[0]
+    assert history.history["val_loss"][-1] < history.history["val_loss"][0]
+
+
+@pytest.mark.parametrize("steps_per_execution", [1, 3])
+def test_custom_training_loop_mirrored(steps_per_execution, monkeypatch):
+    import tensorflow as tf
+    import core.utils
+
+    output_area = tempfile.TemporaryDirectory()
+    config = Config()
+    config.configure(
+        verbosity="DEBUG",
+        output_area=output_area.name,
+        action="train",
+        model_name="test",
+    )
+    config.training_loop = "custom"
+    config.distribution_strategy = "mirrored"
+    config.steps_per_execution = steps_per_execution
+    config.learning_rate = 0.05
+    config.epochs = 5
+    # a partial last batch
+    config.batch_size = 10
+    # created again for this test only
+    monkeypatch.setattr(core.utils, "_distribution_strategy", None)
+    history = tf.keras.callbacks.History()
+    try:
+        train(
+            generate_trainable_model,
+            generate_loss(),
+            generate_dataset(),
+            generate_dataset(),
+            custom_callbacks=[history],
+        )
+    finally:
+        del Config.instance
+        output_area.cleanup()
+    losses = history.history["loss"]
+    assert len(losses) == 5
+    assert losses[-1] < 0.8 * losses[0]
+    assert history.history["val_loss"][-1] < history.history["val_loss"][0]